@@ -1,18 +1,19 @@
+import importlib
+import os
+
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from flask.cli import AppGroup
 from models import db, User, Task, Intention  # db comes from models now
+import coalesce
+import database
+import events
+import metrics
+import ratelimit
+import serializers
 
 import logging
 from logging.handlers import RotatingFileHandler
 
-# import and configure app
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize db with the app
-db.init_app(app)
-
 # Configure Logging
 def setup_logging(app):
     """
@@ -32,47 +33,154 @@ def setup_logging(app):
     # Add the handler to the app's logger
     app.logger.addHandler(handler)
 
-# Call the logging setup function
-setup_logging(app)
+# Modules whose register_commands(app) adds `flask` commands. Only the flask command needs
+# them, so they are imported when it first looks a command up (see LazyCommands).
+COMMAND_MODULES = ['migrations', 'stats', 'sync', 'bulk', 'jobs']
 
-# create tables
-with app.app_context():
-    db.create_all()
+class LazyCommands(AppGroup):
+    """
+    The app's command group (app.cli), filled in from COMMAND_MODULES the first time a
+    command is looked up or listed.
+    """
+
+    def __init__(self, app):
+        super().__init__(app.name)
+        self.app = app
+        self._loaded = False
 
-# import and register blueprints
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            for name in COMMAND_MODULES:
+                importlib.import_module(name).register_commands(self.app)
 
-from routes.user_routes import user_bp
-app.register_blueprint(user_bp)
+    def get_command(self, ctx, name):
+        self._load()
+        return super().get_command(ctx, name)
 
-from routes.tasks import bp as tasks_bp
-app.register_blueprint(tasks_bp)
+    def list_commands(self, ctx):
+        self._load()
+        return super().list_commands(ctx)
 
-from routes.intentions import bp as intentions_bp
-app.register_blueprint(intentions_bp)
+def on_startup(app, fn):
+    """
+    Registers fn(app) to run, in an app context, when the process calls startup(app).
+    """
+    app.extensions.setdefault('startup_hooks', []).append(fn)
 
-from routes.timer import timer_bp
-app.register_blueprint(timer_bp)
+def startup(app):
+    """
+    Runs the app's startup hooks, once. create_app() never connects to the database or starts
+    threads, so tests and CLI commands can build apps cheaply; entry points that are about to
+    serve requests or run jobs (wsgi.py, asgi.py, worker.py, scheduler.py) call this first.
+    """
+    if app.extensions.get('started'):
+        return
+    with app.app_context():
+        for fn in app.extensions.get('startup_hooks', []):
+            fn(app)
+    app.extensions['started'] = True
+
+def prepare_schema(app):
+    """
+    Startup hook: applies pending migrations with AUTO_MIGRATE, or with SCHEMA_CHECK refuses
+    to start against a database that is missing some.
+    """
+    import migrations
+
+    if app.config['AUTO_MIGRATE']:
+        applied = migrations.upgrade(db.engine)
+        if applied:
+            app.logger.info(f"Applied migrations: {applied}")
+    elif app.config['SCHEMA_CHECK']:
+        pending = migrations.unapplied_versions(db.engine)
+        if pending:
+            raise RuntimeError(f"The database is missing migrations {pending}; run `flask db upgrade`")
+
+def create_app(config=None):
+    """
+    Application factory. Builds a configured app with every blueprint registered, without
+    touching the database; call startup(app) before serving from it.
+    `config` overrides the defaults below; `flask run` and wsgi.py both call this.
+    """
+    app = Flask(__name__)
+    app.cli = LazyCommands(app)
+    app.json = serializers.FastJSONProvider(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database.database_url()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_PRAGMAS'] = database.sqlite_pragmas()
+    # Apply pending migrations in startup(). Only the development server does: production
+    # servers run them once in the gunicorn master (see gunicorn.conf.py), so workers don't
+    # race each other. SCHEMA_CHECK=1 makes startup() fail fast if some are missing.
+    app.config['AUTO_MIGRATE'] = False
+    app.config['SCHEMA_CHECK'] = os.getenv('SCHEMA_CHECK', '0') == '1'
+    if config:
+        app.config.update(config)
 
-# define routes
+    # Pool and driver settings follow whichever database the URI points at
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', database.engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
 
-@app.route('/')
-def hello():
-    return "Nosy Canary Backend is Running!"
+    # Initialize db with the app
+    db.init_app(app)
+    with app.app_context():
+        database.configure_engine(db.engine, app.config['SQLITE_PRAGMAS'])
+        metrics.instrument_engine(db.engine)
 
-# scheduler
-from apscheduler.schedulers.background import BackgroundScheduler
+    # Call the logging setup function
+    setup_logging(app)
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+    events.init_app(app)
+    metrics.init_app(app)
+    ratelimit.init_app(app)
+    coalesce.init_app(app)
 
-def scheduled_job():
-    # In a real scenario, you might update a database value, log a message, or enqueue a bot action.
-    # For now, just log to confirm it runs.
-    app.logger.info("Scheduled job ran!")
+    on_startup(app, prepare_schema)
 
-# Add the job to run every hour:
-scheduler.add_job(scheduled_job, 'interval', minutes=1)  # Changed to minutes=1 for testing
+    # import and register blueprints
 
-# run app if main script
+    from routes.user_routes import user_bp
+    app.register_blueprint(user_bp)
+
+    from routes.tasks import bp as tasks_bp
+    app.register_blueprint(tasks_bp)
+
+    from routes.intentions import bp as intentions_bp
+    app.register_blueprint(intentions_bp)
+
+    from routes.timer import timer_bp
+    app.register_blueprint(timer_bp)
+
+    from routes.events import bp as events_bp
+    app.register_blueprint(events_bp)
+
+    from routes.search import bp as search_bp
+    app.register_blueprint(search_bp)
+
+    from routes.stats import bp as stats_bp
+    app.register_blueprint(stats_bp)
+
+    from routes.sync import bp as sync_bp
+    app.register_blueprint(sync_bp)
+
+    # define routes
+
+    @app.route('/')
+    def hello():
+        return "Nosy Canary Backend is Running!"
+
+    return app
+
+# run the development server if main script
 if __name__ == '__main__':
+    app = create_app({'AUTO_MIGRATE': True})
+    startup(app)
+
+    # The dev server runs the scheduler and a job worker in-process. With the reloader on, only
+    # the child process that actually serves requests (WERKZEUG_RUN_MAIN) starts them.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        import jobs
+        from scheduler import start_background_scheduler
+        start_background_scheduler(app)
+        jobs.Worker(app, concurrency=1).start()
+
     app.run(host='0.0.0.0', port=5000, debug=True)
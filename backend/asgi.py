@@ -0,0 +1,238 @@
+"""
+ASGI entry point, an alternative to wsgi.py for serving many slow or idle connections:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+The per-user reads the bot polls are coroutines on an async SQLAlchemy engine (aiosqlite for
+SQLite, asyncpg for PostgreSQL), so a worker waits on thousands of them without a thread each:
+
+    GET /api/user/<discord_id>
+    GET /api/tasks/<discord_id>
+    GET /api/intentions/<discord_id>
+    GET /api/intentions/<discord_id>/history
+    GET /api/timer/<discord_id>
+
+Every other request, including all writes and NDJSON exports, is handed to the Flask app on a
+pool of ASGI_WSGI_THREADS threads (default 16), so validation, events, stats and cache
+versioning stay in one place. Responses, ETags, the response cache, rate limits and request
+metrics are shared with the Flask side and match what gunicorn serves.
+
+uvicorn has no master hook like gunicorn's on_starting, so run `flask db upgrade` first.
+"""
+import contextlib
+import math
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+
+import database
+from app import create_app, startup
+from cache import etag_for, responses, user_ids
+from metrics import instrument_engine, record_request, track_sql
+from models import db, PromptSchedule, User
+from ratelimit import take_token
+from routes.intentions import history_page, history_query, latest_body, latest_query, parse_history_args
+from routes.tasks import is_valid_discord_id, listing_page, listing_query, parse_listing_args
+from routes.timer import timer_body
+from serializers import USER, dumps
+
+flask_app = create_app({'AUTO_MIGRATE': False})
+startup(flask_app)
+wsgi = WSGIMiddleware(flask_app, workers=int(os.getenv('ASGI_WSGI_THREADS', '16')))
+
+with flask_app.app_context():
+    # db.engine.url has the relative SQLite path already resolved against the instance folder
+    url = db.engine.url
+engine = create_async_engine(database.async_database_url(url), **database.async_engine_options(url))
+database.configure_engine(engine.sync_engine, flask_app.config['SQLITE_PRAGMAS'])
+instrument_engine(engine.sync_engine)
+
+def json_response(body, status):
+    return Response(dumps(body), status_code=status, media_type='application/json')
+
+def query_args(request):
+    # The parsers shared with the Flask views expect werkzeug's request.args
+    return MultiDict(request.query_params.multi_items())
+
+async def resolve_user_version(conn, discord_id):
+    return (await conn.execute(
+        db.select(User.id, User.version).where(User.discord_id == discord_id)
+    )).first()
+
+async def conditional_response(request, endpoint, user_id, version, build):
+    """
+    cache.conditional_response() for async views: the same cache keys and ETags, with
+    `build` a coroutine function.
+    """
+    key = (endpoint, user_id, version, request.scope['query_string'])
+    etag = etag_for(key)
+
+    if etag in parse_etags(request.headers.get('if-none-match')):
+        response = Response(status_code=304)
+    else:
+        cached = responses.get(key)
+        if cached is None:
+            body, status = await build()
+            cached = (dumps(body).encode(), status)
+            # Error bodies aren't worth a cache slot
+            if status == 200:
+                responses.set(key, cached)
+        response = Response(cached[0], status_code=cached[1], media_type='application/json')
+
+    response.headers['ETag'] = f'"{etag}"'
+    # Clients may keep the body but must revalidate before using it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def native(rule, delegate=None):
+    """
+    Wraps an async view the way the Flask app wraps its views: the request is charged to the
+    user's read bucket, recorded in the request metrics (SQL statements and body sizes included)
+    and the slow-request log under the Flask `rule`, and an exception becomes a JSON 500.
+    Requests for which delegate(request) is true go to the Flask view instead.
+    """
+    def decorate(view):
+        async def endpoint(request):
+            if delegate is not None and delegate(request):
+                return wsgi
+            began = time.perf_counter()
+            sql = track_sql()
+            discord_id = request.path_params['discord_id']
+
+            wait = take_token(flask_app, 'read', discord_id)
+            if wait:
+                response = json_response({"error": "Too many requests, slow down"}, 429)
+                response.headers['Retry-After'] = str(math.ceil(wait))
+            else:
+                try:
+                    response = await view(request, discord_id)
+                except SQLAlchemyError as e:
+                    flask_app.logger.error(f"Database error in {view.__name__}: {e}")
+                    response = json_response({"error": "Database error occurred"}, 500)
+                except Exception as e:
+                    flask_app.logger.error(f"Unexpected error in {view.__name__}: {e}")
+                    response = json_response({"error": "An internal error occurred"}, 500)
+
+            query = request.scope['query_string'].decode('latin-1')
+            record_request(flask_app, request.method, rule, request.url.path + (f'?{query}' if query else ''),
+                           response.status_code, time.perf_counter() - began, sql,
+                           int(request.headers.get('content-length') or 0), len(response.body))
+            return response
+        return endpoint
+    return decorate
+
+# GET /api/user/<discord_id>
+@native('/api/user/<discord_id>')
+async def get_user(request, discord_id):
+    async with engine.connect() as conn:
+        user = (await conn.execute(
+            USER.select().add_columns(User.version).where(User.discord_id == discord_id)
+        )).first()
+    if user is None:
+        return json_response({'error': 'User not found'}, 404)
+
+    async def build():
+        return USER.dump(user), 200
+
+    return await conditional_response(request, 'user_bp.get_user', user.id, user.version, build)
+
+def tasks_delegated(request):
+    # Flask answers malformed ids too: its 400, or the 405 for GET /api/tasks/batch
+    return (request.query_params.get('format') == 'ndjson'
+            or not is_valid_discord_id(request.path_params['discord_id']))
+
+# GET /api/tasks/<discord_id> - the same query parameters as routes/tasks.py
+@native('/api/tasks/<discord_id>', delegate=tasks_delegated)
+async def get_tasks(request, discord_id):
+    listing, error = parse_listing_args(query_args(request))
+    if error:
+        return json_response({"error": error}, 400)
+    limit, after_id, status, field_names = listing
+
+    async with engine.connect() as conn:
+        user = await resolve_user_version(conn, discord_id)
+        if user is None:
+            return json_response({"error": "User not found"}, 404)
+        user_id, version = user
+
+        async def build():
+            query = listing_query(user_id, after_id, status, field_names).limit(limit + 1)
+            rows = (await conn.execute(query)).all()
+            return listing_page(rows, limit, field_names), 200
+
+        return await conditional_response(request, 'tasks.get_tasks', user_id, version, build)
+
+# GET /api/intentions/<discord_id>
+@native('/api/intentions/<discord_id>')
+async def get_latest_intention(request, discord_id):
+    async with engine.connect() as conn:
+        user = await resolve_user_version(conn, discord_id)
+        if user is None:
+            return json_response({"error": "User not found"}, 404)
+        user_id, version = user
+
+        async def build():
+            return latest_body((await conn.execute(latest_query(user_id))).first(), user_id), 200
+
+        return await conditional_response(request, 'intentions.get_latest_intention', user_id, version, build)
+
+# GET /api/intentions/<discord_id>/history - the same query parameters as routes/intentions.py
+@native('/api/intentions/<discord_id>/history')
+async def get_intention_history(request, discord_id):
+    history, error = parse_history_args(query_args(request))
+    if error:
+        return json_response({"error": error}, 400)
+    limit, since, until, cursor = history
+
+    async with engine.connect() as conn:
+        user = await resolve_user_version(conn, discord_id)
+        if user is None:
+            return json_response({"error": "User not found"}, 404)
+        user_id, version = user
+
+        async def build():
+            rows = (await conn.execute(history_query(user_id, limit, since, until, cursor))).all()
+            return history_page(rows, limit), 200
+
+        return await conditional_response(request, 'intentions.get_intention_history', user_id, version, build)
+
+# GET /api/timer/<discord_id>
+@native('/api/timer/<string:discord_id>')
+async def get_timer(request, discord_id):
+    async with engine.connect() as conn:
+        user_id = user_ids.get(discord_id)
+        if user_id is None:
+            user_id = (await conn.execute(db.select(User.id).where(User.discord_id == discord_id))).scalar()
+            if user_id is None:
+                return json_response({"error": "User not found"}, 404)
+            user_ids.set(discord_id, user_id)
+        schedule = (await conn.execute(
+            db.select(PromptSchedule.next_prompt_at).where(PromptSchedule.user_id == user_id)
+        )).first()
+    return json_response(timer_body(discord_id, schedule), 200)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+app = Starlette(
+    routes=[
+        Route('/api/user/{discord_id}', get_user, methods=['GET']),
+        Route('/api/tasks/{discord_id}', get_tasks, methods=['GET']),
+        Route('/api/intentions/{discord_id}', get_latest_intention, methods=['GET']),
+        Route('/api/intentions/{discord_id}/history', get_intention_history, methods=['GET']),
+        Route('/api/timer/{discord_id}', get_timer, methods=['GET']),
+        # Anything not matched above, including other methods on these paths
+        Mount('', app=wsgi),
+    ],
+    lifespan=lifespan,
+)
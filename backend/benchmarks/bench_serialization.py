@@ -0,0 +1,86 @@
+"""
+Compares the cost of loading and serializing a large task listing.
+
+One user with --tasks tasks (10,000 by default) is seeded into a temporary SQLite database,
+and the whole list is loaded and encoded as JSON in several ways:
+
+    orm + json indent     full ORM objects, dicts built by hand, pretty-printed stdlib json
+                          (what jsonify did in debug mode)
+    orm + json compact    the same, compact stdlib json
+    rows + json compact   only the schema's columns as Row tuples (serializers.TASK), stdlib json
+    rows + orjson         the same, encoded with orjson (skipped when it isn't installed)
+
+Run from the backend directory:
+
+    python benchmarks/bench_serialization.py --tasks 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, startup
+from models import db, Task
+from seed import seed
+from serializers import TASK, orjson
+
+def orm_dicts():
+    tasks = Task.query.filter_by(user_id=1).order_by(Task.id).all()
+    return [{'id': t.id, 'description': t.description, 'status': t.status, 'notes': t.notes} for t in tasks]
+
+def schema_dicts():
+    rows = db.session.execute(TASK.select().where(Task.user_id == 1).order_by(Task.id)).all()
+    return [TASK.dump(row) for row in rows]
+
+VARIANTS = [
+    ('orm + json indent', orm_dicts, lambda body: json.dumps(body, indent=2).encode()),
+    ('orm + json compact', orm_dicts, lambda body: json.dumps(body, separators=(',', ':')).encode()),
+    ('rows + json compact', schema_dicts, lambda body: json.dumps(body, separators=(',', ':')).encode()),
+]
+if orjson is not None:
+    VARIANTS.append(('rows + orjson', schema_dicts, orjson.dumps))
+
+def measure(load, encode, repeat):
+    load_ms, encode_ms = [], []
+    size = 0
+    for _ in range(repeat):
+        # Start every round with an empty identity map, as a new request would
+        db.session.expunge_all()
+        began = time.perf_counter()
+        body = {'tasks': load(), 'next_cursor': None}
+        loaded = time.perf_counter()
+        size = len(encode(body))
+        encode_ms.append((time.perf_counter() - loaded) * 1000)
+        load_ms.append((loaded - began) * 1000)
+    return statistics.median(load_ms), statistics.median(encode_ms), size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--notes-size', type=int, default=100, help="characters of notes per task")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                          'RATE_LIMIT_ENABLED': False, 'AUTO_MIGRATE': True})
+        startup(app)
+        with app.app_context():
+            with db.engine.begin() as conn:
+                seed(conn, 1, args.tasks, 0, notes_size=args.notes_size)
+
+            print(f"{'variant':<22} {'load (ms)':>10} {'encode (ms)':>12} {'total (ms)':>11} {'bytes':>10}")
+            for name, load, encode in VARIANTS:
+                load_ms, encode_ms, size = measure(load, encode, args.repeat)
+                print(f"{name:<22} {load_ms:>10.2f} {encode_ms:>12.2f} {load_ms + encode_ms:>11.2f} {size:>10}")
+            if orjson is None:
+                print("orjson is not installed; pip install orjson to include it")
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
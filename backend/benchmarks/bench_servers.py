@@ -0,0 +1,115 @@
+"""
+Compares the sync server (gunicorn, wsgi.py) with the async one (uvicorn, asgi.py) on the
+read endpoints asgi.py serves natively.
+
+A database is seeded into a temporary directory, both servers are started on it in turn with
+the same number of worker processes, and every read scenario from loadtest.py is driven at
+each --concurrency level. High concurrency is where they differ: gunicorn answers at most
+workers x GUNICORN_THREADS requests at a time, while uvicorn keeps every connection open on
+its event loop.
+
+Run from the backend directory (needs gunicorn, uvicorn and aiohttp installed):
+
+    python benchmarks/bench_servers.py --workers 2 --concurrency 32 256 1024 --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest import SCENARIOS, Context, run_scenario
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READ_SCENARIOS = [
+    scenario for scenario in SCENARIOS
+    if scenario[1] == 'GET' and scenario[0].split()[1].split('/')[2] in ('user', 'tasks', 'intentions', 'timer')
+]
+
+def server_commands(port, workers):
+    return {
+        'sync (gunicorn)': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                            '-b', f'127.0.0.1:{port}', '-w', str(workers), '--access-logfile', os.devnull, 'wsgi:app'],
+        'async (uvicorn)': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+                            '--port', str(port), '--workers', str(workers), '--no-access-log'],
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not start listening on port {port}")
+
+async def drive(url, args, concurrency):
+    import aiohttp
+
+    ctx = Context(args.users, args.tasks, 1)
+    results = {}
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        for scenario in READ_SCENARIOS:
+            results[scenario[0]] = await run_scenario(session, url, scenario, ctx, args.requests, concurrency)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=50, help="tasks per user")
+    parser.add_argument('--intentions', type=int, default=30, help="intentions per user")
+    parser.add_argument('--workers', type=int, default=2, help="worker processes for both servers")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[32, 256, 1024])
+    parser.add_argument('--requests', type=int, default=5000, help="requests per endpoint and concurrency level")
+    args = parser.parse_args()
+
+    import sqlalchemy as sa
+    import migrations
+    from seed import seed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = sa.create_engine(database_url)
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            seed(conn, args.users, args.tasks, args.intentions)
+        engine.dispose()
+
+        env = {**os.environ, 'DATABASE_URL': database_url, 'RATE_LIMIT_ENABLED': '0'}
+        results = {}
+        port = free_port()
+        for server, command in server_commands(port, args.workers).items():
+            process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+            try:
+                wait_for_port(port)
+                for concurrency in args.concurrency:
+                    results[server, concurrency] = asyncio.run(drive(f'http://127.0.0.1:{port}', args, concurrency))
+            finally:
+                process.terminate()
+                process.wait()
+
+    servers = list(server_commands(port, args.workers))
+    print(f"{'endpoint':<36} {'conc':>5} " + " ".join(f"{server + ' req/s':>22} {'p99 ms':>9} {'errors':>7}" for server in servers))
+    for concurrency in args.concurrency:
+        for name, _, _, _ in READ_SCENARIOS:
+            cells = []
+            for server in servers:
+                result = results[server, concurrency][name]
+                cells.append(f"{result['throughput_rps'] or 0:>22.1f} {result['p99_ms'] or 0:>9.2f} {result['errors']:>7}")
+            print(f"{name:<36} {concurrency:>5} " + " ".join(cells))
+
+if __name__ == '__main__':
+    main()
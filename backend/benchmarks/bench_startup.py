@@ -0,0 +1,117 @@
+"""
+Measures how long the backend takes to start, and fails when it is over its budget.
+
+Every run is a fresh interpreter, like a new worker under autoscaling, started with
+`python -X importtime`. It times four phases:
+
+    import        import app (Flask, SQLAlchemy, models and the modules the factory needs)
+    create_app    building the app: config, extensions, blueprints
+    startup       startup(app), the hooks an entry point runs before serving
+    first request GET / through the test client
+
+and checks that create_app() had no side effects: no thread was started and the (empty,
+temporary) SQLite database was never opened. The modules that cost the most to import, from
+the -X importtime log of the last run, are listed below the timings.
+
+Run from the backend directory:
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 800
+
+It exits with status 1 when the median import + create_app time is over --budget-ms
+(default STARTUP_BUDGET_MS, 1000) or create_app() had a side effect, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ['import', 'create_app', 'startup', 'first request']
+
+CHILD = """
+import json, os, sys, threading, time
+
+started = time.perf_counter()
+import app as backend
+imported = time.perf_counter()
+app = backend.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + sys.argv[1]})
+created = time.perf_counter()
+threads = threading.active_count()
+opened = os.path.exists(sys.argv[1])
+backend.startup(app)
+ready = time.perf_counter()
+app.test_client().get('/')
+served = time.perf_counter()
+
+print(json.dumps({
+    'import': imported - started, 'create_app': created - imported,
+    'startup': ready - created, 'first request': served - ready,
+    'threads': threads, 'opened': opened,
+}))
+"""
+
+def run_once(tmp, n):
+    path = os.path.join(tmp, f'startup-{n}.db')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, path],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"Startup failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+def slowest_imports(log, top):
+    """
+    The `top` modules with the largest cumulative import time, from a -X importtime log,
+    as (microseconds, module name, depth in the import tree).
+    """
+    modules = []
+    for line in log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((int(cumulative), name.strip(), depth))
+    return sorted(modules, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '1000')),
+                        help="maximum median import + create_app time")
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in range(args.runs):
+            result, log = run_once(tmp, n)
+            results.append(result)
+
+    print(f"{'phase':<14} {'median (ms)':>12} {'max (ms)':>10}")
+    medians = {}
+    for phase in PHASES:
+        times = [r[phase] * 1000 for r in results]
+        medians[phase] = statistics.median(times)
+        print(f"{phase:<14} {medians[phase]:>12.1f} {max(times):>10.1f}")
+    boot = medians['import'] + medians['create_app']
+    print(f"{'boot':<14} {boot:>12.1f}    (import + create_app, budget {args.budget_ms:.0f} ms)")
+
+    print("\nslowest imports (cumulative, last run):")
+    for cumulative, name, depth in slowest_imports(log, args.top):
+        print(f"{cumulative / 1000:>8.1f} ms  {'  ' * depth}{name}")
+
+    failures = []
+    if boot > args.budget_ms:
+        failures.append(f"boot took {boot:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if any(r['threads'] > 1 for r in results):
+        failures.append("create_app() started a thread")
+    if any(r['opened'] for r in results):
+        failures.append("create_app() opened the database")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures per-request latency of the per-user read endpoints and search as the tables grow.
+
+For each table size the database is seeded with that many tasks and intentions spread over
+many users, plus one probe user with a fixed number of rows. Only the probe user is queried,
+so any growth in latency comes from how the query finds its rows, not from larger responses.
+The search probe looks for a word that every seeded task contains, so it also shows whether
+search stays scoped to one user's rows.
+
+Run from the backend directory:
+
+    python benchmarks/bench_table_size.py --sizes 10000 100000 1000000
+    python benchmarks/bench_table_size.py --no-indexes   # same, with the per-user indexes dropped
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+
+from app import create_app, startup
+from cache import responses, user_ids
+from models import db, User, Task, Intention
+
+PROBE_DISCORD_ID = '100000000000000000'
+PROBE_ROWS = 20
+ROWS_PER_USER = 50
+CHUNK = 10000
+
+
+def seed(conn, size):
+    users = User.__table__
+    tasks = Task.__table__
+    intentions = Intention.__table__
+    start = datetime(2024, 1, 1)
+
+    user_count = size // ROWS_PER_USER + 1
+    conn.execute(users.insert(), [
+        {'id': i, 'discord_id': str(10 ** 17 + i), 'canary_bedtime': '22:00'} for i in range(1, user_count + 1)
+    ])
+    for offset in range(0, size, CHUNK):
+        ids = range(offset, min(offset + CHUNK, size))
+        conn.execute(tasks.insert(), [
+            {'user_id': i % user_count + 1, 'description': f'task {i}', 'status': 'pending', 'notes': ''} for i in ids
+        ])
+        conn.execute(intentions.insert(), [
+            {'user_id': i % user_count + 1, 'text': f'intention {i}', 'timestamp': start + timedelta(minutes=i)} for i in ids
+        ])
+
+    probe_id = user_count + 1
+    conn.execute(users.insert(), [{'id': probe_id, 'discord_id': PROBE_DISCORD_ID, 'canary_bedtime': '22:00'}])
+    conn.execute(tasks.insert(), [
+        {'user_id': probe_id, 'description': f'probe task {i}', 'status': 'pending', 'notes': ''} for i in range(PROBE_ROWS)
+    ])
+    conn.execute(intentions.insert(), [
+        {'user_id': probe_id, 'text': f'probe {i}', 'timestamp': start + timedelta(hours=i)} for i in range(PROBE_ROWS)
+    ])
+
+
+def timed(client, url, requests, counter):
+    client.get(url)  # warm up
+    samples = []
+    counter['queries'] = 0
+    for _ in range(requests):
+        began = time.perf_counter()
+        resp = client.get(url)
+        samples.append((time.perf_counter() - began) * 1000)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    return statistics.median(samples), counter['queries'] / requests
+
+
+def run(size, requests, drop_indexes):
+    # Every run builds a fresh database, so ids cached from the previous run are stale
+    user_ids.clear()
+    # Measure the queries themselves, not the response cache in front of them
+    responses.maxsize = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                          'RATE_LIMIT_ENABLED': False, 'AUTO_MIGRATE': True})
+        startup(app)
+        with app.app_context():
+            with db.engine.begin() as conn:
+                seed(conn, size)
+                if drop_indexes:
+                    conn.execute(sa.text('DROP INDEX ix_tasks_user_id_id'))
+                    conn.execute(sa.text('DROP INDEX ix_tasks_user_id_status_id'))
+                    conn.execute(sa.text('DROP INDEX ix_intentions_user_id_timestamp'))
+                    # The sync indexes start with user_id too, so they would stand in for the others
+                    conn.execute(sa.text('DROP INDEX ix_tasks_user_id_seq'))
+                    conn.execute(sa.text('DROP INDEX ix_intentions_user_id_seq'))
+                conn.execute(sa.text('ANALYZE'))
+
+            counter = {'queries': 0}
+
+            @sa.event.listens_for(db.engine, 'before_cursor_execute')
+            def count_query(*args):
+                counter['queries'] += 1
+
+        client = app.test_client()
+        result = (
+            timed(client, f'/api/tasks/{PROBE_DISCORD_ID}', requests, counter),
+            timed(client, f'/api/intentions/{PROBE_DISCORD_ID}', requests, counter),
+            timed(client, f'/api/search/{PROBE_DISCORD_ID}?q=task', requests, counter),
+        )
+        with app.app_context():
+            db.engine.dispose()
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--no-indexes', action='store_true', help="drop the per-user indexes after seeding")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'GET tasks (ms)':>16} {'queries/req':>12} {'GET intention (ms)':>20} {'queries/req':>12} "
+          f"{'GET search (ms)':>17} {'queries/req':>12}")
+    for size in args.sizes:
+        (tasks_ms, tasks_q), (intention_ms, intention_q), (search_ms, search_q) = run(size, args.requests, args.no_indexes)
+        print(f"{size:>10} {tasks_ms:>16.3f} {tasks_q:>12.2f} {intention_ms:>20.3f} {intention_q:>12.2f} "
+              f"{search_ms:>17.3f} {search_q:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
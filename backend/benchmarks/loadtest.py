@@ -0,0 +1,243 @@
+"""
+Load test for every backend route.
+
+1. Seed a database (SQLite by default) with a known set of users, tasks and intentions:
+
+       python benchmarks/loadtest.py seed --database sqlite:////tmp/loadtest.db --users 1000 --tasks 50 --intentions 30
+
+2. Start a server on that database, e.g.
+
+       DATABASE_URL=sqlite:////tmp/loadtest.db RATE_LIMIT_ENABLED=0 gunicorn -c gunicorn.conf.py wsgi:app
+
+   (with rate limiting on, the load generator measures 429s instead of the endpoints)
+
+3. Drive each endpoint in turn with an async load generator and save the results:
+
+       python benchmarks/loadtest.py run --url http://127.0.0.1:5000 --users 1000 --tasks 50 \\
+           --concurrency 32 --requests 2000 --output results.json
+
+4. Compare two runs, e.g. from before and after a change:
+
+       python benchmarks/loadtest.py compare before.json after.json
+
+`run` needs the same --users/--tasks as `seed` to know which ids exist. It writes to the
+database (tasks, intentions, batch operations), so reseed before runs you want to compare.
+The output JSON holds p50/p95/p99/mean latency in ms, throughput and error counts per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seed import discord_id_for
+
+class Context:
+    """
+    What the scenarios need to build requests: the seeded id ranges, plus the ids of tasks
+    created during this run so the DELETE scenario never removes seeded data other phases use.
+    """
+
+    def __init__(self, users, tasks_per_user, first_task):
+        self.users = users
+        self.tasks_per_user = tasks_per_user
+        self.first_task = first_task
+        self.created_tasks = []
+
+    def discord_id(self):
+        return discord_id_for(random.randint(1, self.users))
+
+    def seeded_task(self):
+        return self.first_task + random.randrange(self.users * self.tasks_per_user)
+
+# (name, method, build(ctx) -> (path, json body or None), expected statuses)
+SCENARIOS = [
+    ('GET /api/user/<id>', 'GET', lambda c: (f'/api/user/{c.discord_id()}', None), {200}),
+    ('POST /api/user', 'POST', lambda c: ('/api/user', {'discord_id': c.discord_id(), 'canary_bedtime': '22:00'}), {200}),
+    ('GET /api/tasks/<id>', 'GET', lambda c: (f'/api/tasks/{c.discord_id()}', None), {200}),
+    ('GET /api/tasks/<id>?status&fields', 'GET',
+     lambda c: (f'/api/tasks/{c.discord_id()}?status=pending&fields=id,description,status', None), {200}),
+    ('POST /api/tasks', 'POST', lambda c: ('/api/tasks', {'discord_id': c.discord_id(), 'description': 'load test task'}), {201}),
+    ('PUT /api/tasks/<task_id>', 'PUT', lambda c: (f'/api/tasks/{c.seeded_task()}', {'status': 'in-progress'}), {200}),
+    ('DELETE /api/tasks/<task_id>', 'DELETE', lambda c: (f'/api/tasks/{c.created_tasks.pop()}', None), {200}),
+    ('POST /api/tasks/batch', 'POST', lambda c: ('/api/tasks/batch', {'discord_id': c.discord_id(), 'operations': [
+        {'op': 'create', 'description': f'batch task {i}'} for i in range(10)
+    ]}), {200}),
+    ('GET /api/intentions/<id>', 'GET', lambda c: (f'/api/intentions/{c.discord_id()}', None), {200}),
+    ('GET /api/intentions/<id>/history', 'GET', lambda c: (f'/api/intentions/{c.discord_id()}/history?limit=20', None), {200}),
+    ('POST /api/intentions', 'POST', lambda c: ('/api/intentions', {'discord_id': c.discord_id(), 'text': 'load test'}), {201}),
+    # Seeded rows are at version 0, so since=0 is a live cursor and returns what the writes above changed
+    ('GET /api/sync/<id>?since', 'GET', lambda c: (f'/api/sync/{c.discord_id()}?since=0', None), {200}),
+    ('GET /api/search/<id>', 'GET', lambda c: (f'/api/search/{c.discord_id()}?q=task', None), {200}),
+    ('GET /api/stats/<id>', 'GET', lambda c: (f'/api/stats/{c.discord_id()}', None), {200}),
+    ('GET /api/timer/<id>', 'GET', lambda c: (f'/api/timer/{c.discord_id()}', None), {200}),
+    ('GET /api/events', 'GET', lambda c: ('/api/events?after=0&limit=100', None), {200}),
+]
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def run_scenario(session, base_url, scenario, ctx, requests, concurrency):
+    import aiohttp
+
+    name, method, build, expected = scenario
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            try:
+                path, body = build(ctx)
+            except IndexError:
+                return  # no created tasks left to delete
+            began = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, json=body) as resp:
+                    payload = await resp.read()
+                    ok = resp.status in expected
+            except aiohttp.ClientError:
+                ok = False
+            latencies.append((time.perf_counter() - began) * 1000)
+            if not ok:
+                errors += 1
+            elif name == 'POST /api/tasks':
+                ctx.created_tasks.append(json.loads(payload)['task_id'])
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+async def run_all(args):
+    import aiohttp
+
+    ctx = Context(args.users, args.tasks, args.first_task)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    results = {}
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for scenario in SCENARIOS:
+            if args.only and not any(part in scenario[0] for part in args.only):
+                continue
+            result = await run_scenario(session, args.url.rstrip('/'), scenario, ctx, args.requests, args.concurrency)
+            results[scenario[0]] = result
+            print(f"{scenario[0]:<36} {result['throughput_rps'] or 0:>9.1f} req/s  "
+                  f"p50 {result['p50_ms'] or 0:>8.2f}  p95 {result['p95_ms'] or 0:>8.2f}  "
+                  f"p99 {result['p99_ms'] or 0:>8.2f} ms  errors {result['errors']}")
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def cmd_seed(args):
+    import sqlalchemy as sa
+    import migrations
+    from seed import seed
+
+    engine = sa.create_engine(args.database)
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        first_task, _ = seed(conn, args.users, args.tasks, args.intentions, notes_size=args.notes_size)
+    print(f"Seeded {args.users} users, {args.users * args.tasks} tasks (first id {first_task}), "
+          f"{args.users * args.intentions} intentions")
+
+def cmd_run(args):
+    results = asyncio.run(run_all(args))
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'url': args.url,
+            'users': args.users,
+            'tasks_per_user': args.tasks,
+            'concurrency': args.concurrency,
+            'requests_per_endpoint': args.requests,
+            'python': platform.python_version(),
+        },
+        'endpoints': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+def cmd_compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}")
+    print(f"{'endpoint':<36} {'req/s':>18} {'p95 ms':>22} {'p99 ms':>22}")
+    for name, new in after['endpoints'].items():
+        old = before['endpoints'].get(name)
+        if old is None:
+            continue
+        cells = []
+        for key in ('throughput_rps', 'p95_ms', 'p99_ms'):
+            if old[key] and new[key] is not None:
+                change = (new[key] - old[key]) / old[key] * 100
+                cells.append(f"{old[key]:>8.1f} → {new[key]:<8.1f}{change:+.0f}%")
+            else:
+                cells.append(f"{'n/a':>22}")
+        print(f"{name:<36} " + " ".join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = sub.add_parser('seed', help="seed a database")
+    seed_parser.add_argument('--database', default='sqlite:///instance/database.db')
+    seed_parser.add_argument('--users', type=int, default=1000)
+    seed_parser.add_argument('--tasks', type=int, default=50, help="tasks per user")
+    seed_parser.add_argument('--intentions', type=int, default=30, help="intentions per user")
+    seed_parser.add_argument('--notes-size', type=int, default=200, help="characters of notes per task")
+    seed_parser.set_defaults(func=cmd_seed)
+
+    run_parser = sub.add_parser('run', help="drive every endpoint and report latency")
+    run_parser.add_argument('--url', default='http://127.0.0.1:5000')
+    run_parser.add_argument('--users', type=int, default=1000)
+    run_parser.add_argument('--tasks', type=int, default=50, help="tasks per user in the seed")
+    run_parser.add_argument('--first-task', type=int, default=1, help="first seeded task id")
+    run_parser.add_argument('--concurrency', type=int, default=32)
+    run_parser.add_argument('--requests', type=int, default=1000, help="requests per endpoint")
+    run_parser.add_argument('--only', nargs='+', help="only endpoints whose name contains one of these")
+    run_parser.add_argument('--output', help="write results as JSON to this file")
+    run_parser.set_defaults(func=cmd_run)
+
+    compare_parser = sub.add_parser('compare', help="compare two result files")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
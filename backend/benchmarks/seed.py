@@ -0,0 +1,60 @@
+"""
+Bulk seeding of users, tasks and intentions for benchmarks.
+
+Rows are inserted with executemany in chunks and with explicit ids, so the benchmarks know
+which ids exist without reading them back: user n (1-based) has discord_id discord_id_for(n),
+and task/intention ids are allocated user by user in order.
+"""
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import User, Task, Intention
+
+CHUNK = 10000
+STATUSES = ['pending', 'in-progress', 'completed']
+
+def discord_id_for(n):
+    return str(10 ** 17 + n)
+
+def _chunks(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def seed(conn, users, tasks_per_user, intentions_per_user, first_user=1, notes_size=0):
+    """
+    Inserts `users` users starting at id `first_user`, each with the given number of tasks
+    and intentions. Returns (first task id, first intention id) of the inserted rows.
+    """
+    start = datetime(2024, 1, 1)
+    user_ids = range(first_user, first_user + users)
+    first_task = (conn.execute(sa.select(sa.func.max(Task.id))).scalar() or 0) + 1
+    first_intention = (conn.execute(sa.select(sa.func.max(Intention.id))).scalar() or 0) + 1
+    notes = 'n' * notes_size
+
+    for batch in _chunks({'id': n, 'discord_id': discord_id_for(n), 'canary_bedtime': '22:00'} for n in user_ids):
+        conn.execute(User.__table__.insert(), batch)
+
+    tasks = (
+        {'id': first_task + i * tasks_per_user + t, 'user_id': n, 'description': f'task {t} of user {n}',
+         'status': STATUSES[t % len(STATUSES)], 'notes': notes}
+        for i, n in enumerate(user_ids) for t in range(tasks_per_user)
+    )
+    for batch in _chunks(tasks):
+        conn.execute(Task.__table__.insert(), batch)
+
+    intentions = (
+        {'id': first_intention + i * intentions_per_user + k, 'user_id': n, 'text': f'intention {k} of user {n}',
+         'timestamp': start + timedelta(days=k, minutes=n % 1440)}
+        for i, n in enumerate(user_ids) for k in range(intentions_per_user)
+    )
+    for batch in _chunks(intentions):
+        conn.execute(Intention.__table__.insert(), batch)
+
+    return first_task, first_intention
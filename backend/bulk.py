@@ -0,0 +1,172 @@
+"""
+Bulk export and import of the whole database as gzip-compressed NDJSON, for backups,
+seeding and moving between SQLite and PostgreSQL:
+
+    flask data export backup.ndjson.gz
+    DATABASE_URL=postgresql+psycopg2://... flask data import backup.ndjson.gz
+
+The file starts with a header line ({"format", "schema_version", "exported_at"}). Each table
+follows as a {"table", "columns"} line and then one JSON array of values per row, so column
+names aren't repeated a million times.
+
+Export streams every table through a server-side cursor in chunks, so memory stays flat
+whatever the table size. Import inserts chunks of rows with executemany into a database at
+the same schema version that has no users yet, all in one transaction: a failed import leaves
+the database empty, ready to be imported into again. The events
+and jobs tables are not exported; they only hold recent pushes to the bot and queued work.
+"""
+import gzip
+import json
+import time
+from datetime import date, datetime
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+
+import migrations
+from models import db, DailyStats, Intention, PromptSchedule, Task, Tombstone, User
+from serializers import dumps, orjson
+
+FORMAT = 'nosy-canary-export'
+CHUNK_SIZE = 5000
+# At higher levels gzip dominates the export time, for files only slightly smaller
+COMPRESS_LEVEL = 1
+
+loads = orjson.loads if orjson is not None else json.loads
+
+# Parents before children, so foreign keys hold at every chunk boundary
+TABLES = [User.__table__, Task.__table__, Intention.__table__, PromptSchedule.__table__,
+          DailyStats.__table__, Tombstone.__table__]
+
+def _schema_version(conn):
+    return max(migrations.applied_versions(conn), default=0)
+
+def _encoders(table):
+    return [
+        (lambda value: value.isoformat() if value is not None else None)
+        if isinstance(column.type, (sa.DateTime, sa.Date)) else None
+        for column in table.columns
+    ]
+
+def _decoders(table, names):
+    decoders = []
+    for name in names:
+        column_type = table.columns[name].type
+        if isinstance(column_type, sa.DateTime):
+            decoders.append(lambda value: datetime.fromisoformat(value) if value is not None else None)
+        elif isinstance(column_type, sa.Date):
+            decoders.append(lambda value: date.fromisoformat(value) if value is not None else None)
+        else:
+            decoders.append(None)
+    return decoders
+
+def export_database(engine, path, chunk_size=CHUNK_SIZE):
+    """
+    Writes every table to `path`. Returns {table name: row count}.
+    """
+    counts = {}
+    with engine.connect() as conn, gzip.open(path, 'wt', encoding='utf-8', compresslevel=COMPRESS_LEVEL) as out:
+        out.write(json.dumps({"format": FORMAT, "schema_version": _schema_version(conn),
+                              "exported_at": datetime.utcnow().isoformat()}) + '\n')
+        for table in TABLES:
+            out.write(json.dumps({"table": table.name, "columns": [column.name for column in table.columns]}) + '\n')
+            encoders = _encoders(table)
+            # stream_results: a server-side cursor on PostgreSQL, fetched yield_per rows at a time
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                sa.select(table).order_by(*table.primary_key.columns)
+            )
+            count = 0
+            for rows in result.partitions():
+                out.write(''.join(
+                    dumps([encode(value) if encode else value for encode, value in zip(encoders, row)]) + '\n'
+                    for row in rows
+                ))
+                count += len(rows)
+            counts[table.name] = count
+    return counts
+
+def import_database(engine, path, chunk_size=CHUNK_SIZE):
+    """
+    Loads a file written by export_database into an empty database, in a single transaction.
+    Returns {table name: row count}.
+    """
+    tables = {table.name: table for table in TABLES}
+    counts = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get("format") != FORMAT:
+            raise click.ClickException(f"{path} is not a {FORMAT} file")
+        with engine.begin() as conn:
+            version = _schema_version(conn)
+            if conn.execute(sa.select(sa.func.count()).select_from(User.__table__)).scalar():
+                raise click.ClickException("Import needs a database without users; this one has some")
+            if header["schema_version"] != version:
+                raise click.ClickException(
+                    f"The export is at schema version {header['schema_version']} but the database is at {version}; "
+                    "migrate both to the same version first"
+                )
+
+            table = None
+            chunk = []
+
+            def flush():
+                if chunk:
+                    conn.execute(table.insert(), chunk)
+                    counts[table.name] += len(chunk)
+                    chunk.clear()
+
+            for line in f:
+                item = loads(line)
+                if isinstance(item, dict):
+                    flush()
+                    table = tables[item["table"]]
+                    names = item["columns"]
+                    decoders = _decoders(table, names)
+                    counts[table.name] = 0
+                    continue
+                chunk.append({name: decode(value) if decode else value
+                              for name, decode, value in zip(names, decoders, item)})
+                if len(chunk) >= chunk_size:
+                    flush()
+            flush()
+
+            _reset_sequences(conn)
+    return counts
+
+def _reset_sequences(conn):
+    # Rows were inserted with explicit ids, which doesn't advance PostgreSQL's id sequences
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        if 'id' in table.columns and table.columns['id'].autoincrement is not False:
+            conn.execute(sa.text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"coalesce(max(id), 0) + 1, false) FROM {table.name}"
+            ))
+
+def register_commands(app):
+    data_cli = AppGroup('data', help="Export and import the whole database.")
+
+    @data_cli.command('export')
+    @click.argument('path')
+    @click.option('--chunk-size', type=int, default=CHUNK_SIZE, show_default=True)
+    def export_command(path, chunk_size):
+        """Write every table to PATH as gzipped NDJSON."""
+        started = time.perf_counter()
+        counts = export_database(db.engine, path, chunk_size)
+        click.echo(f"Exported {_describe(counts)} to {path} in {time.perf_counter() - started:.1f}s.")
+
+    @data_cli.command('import')
+    @click.argument('path')
+    @click.option('--chunk-size', type=int, default=CHUNK_SIZE, show_default=True)
+    def import_command(path, chunk_size):
+        """Load an export from PATH into an empty, migrated database."""
+        started = time.perf_counter()
+        counts = import_database(db.engine, path, chunk_size)
+        click.echo(f"Imported {_describe(counts)} from {path} in {time.perf_counter() - started:.1f}s.")
+
+    app.cli.add_command(data_cli)
+
+def _describe(counts):
+    return ', '.join(f"{count} {name}" for name, count in counts.items())
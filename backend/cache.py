@@ -0,0 +1,120 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, jsonify, request
+
+from models import db, User
+
+class LRUCache:
+    """
+    A small thread-safe mapping that evicts the least recently used key once it holds
+    `maxsize` entries. Request threads share one instance per process.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# discord_id -> users.id. A user's id never changes once created, so entries stay valid;
+# unknown discord_ids are not cached, so users created by another worker are found on the next request.
+user_ids = LRUCache(int(os.getenv('USER_ID_CACHE_SIZE', '10000')))
+
+def resolve_user_id(discord_id):
+    """
+    Returns the users.id for a discord_id, or None if there is no such user.
+    Only a cache miss costs a query, and that one is answered from the discord_id index.
+    """
+    user_id = user_ids.get(discord_id)
+    if user_id is None:
+        user_id = db.session.execute(
+            db.select(User.id).filter_by(discord_id=discord_id)
+        ).scalar()
+        if user_id is not None:
+            user_ids.set(discord_id, user_id)
+    return user_id
+
+def invalidate_user(discord_id):
+    user_ids.pop(discord_id)
+
+# (endpoint, user id, user version, query string, *vary) -> (body bytes, status). A write bumps the
+# user's version, so older entries are simply never asked for again and age out of the LRU.
+responses = LRUCache(int(os.getenv('RESPONSE_CACHE_SIZE', '2048')))
+
+def bump_user_version(user_id):
+    """
+    Marks everything cached for a user as stale. Runs in the caller's transaction, and
+    returns the new version, which the write also stamps on the rows it changes (see sync.py).
+    """
+    bump = db.update(User).where(User.id == user_id).values(version=User.version + 1)
+    if db.engine.dialect.update_returning:
+        return db.session.execute(bump.returning(User.version)).scalar()
+    # The UPDATE holds the row lock, so no other writer can move the version in between
+    db.session.execute(bump)
+    return db.session.execute(db.select(User.version).where(User.id == user_id)).scalar()
+
+def resolve_user_version(discord_id):
+    """
+    Returns (users.id, users.version) for a discord_id, or None if there is no such user.
+    """
+    return db.session.execute(
+        db.select(User.id, User.version).filter_by(discord_id=discord_id)
+    ).first()
+
+def etag_for(key):
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+
+def conditional_response(user_id, version, build, vary=()):
+    """
+    Serves a per-user read endpoint with an ETag derived from the user's version.
+    Answers a matching If-None-Match with 304, then tries the response cache, and only calls
+    build() -> (body, status) when neither applies. `vary` holds anything else the body
+    depends on, such as the current date.
+    """
+    key = (request.endpoint, user_id, version, request.query_string, *vary)
+    etag = etag_for(key)
+
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        cached = responses.get(key)
+        if cached is None:
+            body, status = build()
+            cached = (jsonify(body).get_data(), status)
+            # Error bodies aren't worth a cache slot
+            if status == 200:
+                responses.set(key, cached)
+        response = Response(cached[0], status=cached[1], mimetype='application/json')
+
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate before using it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,119 @@
+"""
+Optional group commit for small writes.
+
+With WRITE_COALESCE_MS set, commit_write() doesn't commit right away. The first writer to
+arrive waits that many milliseconds for concurrent writers in the same process to join, runs
+every write that arrived in its own session, and commits them all at once. Each writer gets
+its own result or exception back. Many small commits become one, which raises write
+throughput where commits are expensive (fsync, network round trips) at the cost of up to
+WRITE_COALESCE_MS extra latency.
+
+A write is a function that changes db.session (add, flush, publish events...) without
+committing, and returns plain values (ids, not ORM objects), since it may run in another
+request's session. If one write in a group fails, the group is rolled back and every write
+is retried in a transaction of its own, so a bad write only fails itself. Writes may therefore
+run twice and must only have effects that a rollback undoes; events qualify, since both event
+logs publish on commit.
+
+A leader commits one group, its own, and hands the writes that arrived meanwhile to the first
+of them, so no request waits on more than one group. The group's SQL is counted in the
+leader's request metrics, and none in the other requests'.
+"""
+import os
+import threading
+import time
+
+from flask import current_app
+
+from models import db
+
+class _Write:
+    def __init__(self, fn):
+        self.fn = fn
+        self.result = None
+        self.error = None
+        # Set under the coalescer's lock when this write is to commit a group
+        self.lead = False
+        # Set when the write is committed (or failed), or when it has been made leader
+        self.wake = threading.Event()
+
+class WriteCoalescer:
+    def __init__(self, window_seconds, max_batch=64):
+        self.window = window_seconds
+        self.max_batch = max_batch
+        self._pending = []
+        self._leading = False
+        self._lock = threading.Lock()
+
+    def run(self, fn):
+        write = _Write(fn)
+        with self._lock:
+            self._pending.append(write)
+            first = not self._leading
+            if first:
+                self._leading = write.lead = True
+
+        if not first:
+            write.wake.wait()
+        if write.lead:
+            if first:
+                # A successor's group has already waited for the previous commit
+                time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            try:
+                self._commit(batch)
+            finally:
+                self._hand_over()
+
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _hand_over(self):
+        with self._lock:
+            if self._pending:
+                successor = self._pending[0]
+                successor.lead = True
+                successor.wake.set()
+            else:
+                self._leading = False
+
+    def _commit(self, batch):
+        try:
+            for write in batch:
+                write.result = write.fn()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for write in batch:
+                write.result = None
+                try:
+                    write.result = write.fn()
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    write.error = e
+        finally:
+            for write in batch:
+                write.wake.set()
+
+def init_app(app):
+    app.config.setdefault('WRITE_COALESCE_MS', int(os.getenv('WRITE_COALESCE_MS', '0')))
+    app.config.setdefault('WRITE_COALESCE_MAX_BATCH', int(os.getenv('WRITE_COALESCE_MAX_BATCH', '64')))
+    if app.config['WRITE_COALESCE_MS'] > 0:
+        app.extensions['write_coalescer'] = WriteCoalescer(
+            app.config['WRITE_COALESCE_MS'] / 1000, app.config['WRITE_COALESCE_MAX_BATCH']
+        )
+
+def commit_write(fn):
+    """
+    Runs fn() and commits its changes, alone or grouped with concurrent writes when
+    coalescing is on. Returns what fn returned.
+    """
+    coalescer = current_app.extensions.get('write_coalescer')
+    if coalescer is None:
+        result = fn()
+        db.session.commit()
+        return result
+    return coalescer.run(fn)
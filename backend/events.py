@@ -0,0 +1,111 @@
+"""
+Events pushed from the backend to the bot.
+
+Writers publish events (a due prompt, a changed task) and the bot reads them in batches
+from GET /api/events/stream, resuming after the last id it handled. Two logs are available,
+chosen with the EVENT_LOG setting:
+
+    database  (default) events are rows written in the publisher's own transaction, so an
+              event exists exactly when the change it describes was committed. Works across
+              web workers and the scheduler process.
+    memory    an in-process list for tests and single-process runs. Events wait on the
+              publisher's session and are appended when it commits; a rollback drops them.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Event
+
+class DatabaseEventLog:
+    # On PostgreSQL ids are handed out before commit, so a transaction holding a lower id can
+    # commit after a reader already saw a higher one. Holding back the newest events for a
+    # moment lets those transactions finish first. SQLite commits in id order and needs no delay.
+    settle_delay = timedelta(seconds=1)
+
+    def publish(self, kind, discord_id, payload):
+        db.session.add(Event(kind=kind, discord_id=discord_id, payload=json.dumps(payload),
+                             created_at=datetime.utcnow()))
+
+    def latest_id(self):
+        return db.session.execute(db.select(db.func.max(Event.id))).scalar() or 0
+
+    def read(self, after, limit):
+        query = db.select(Event).where(Event.id > after).order_by(Event.id).limit(limit)
+        if db.engine.dialect.name != 'sqlite':
+            query = query.where(Event.created_at <= datetime.utcnow() - self.settle_delay)
+        events = [
+            {"id": event.id, "kind": event.kind, "discord_id": event.discord_id, "payload": json.loads(event.payload)}
+            for event in db.session.execute(query).scalars()
+        ]
+        # Don't keep a connection (or a read snapshot) open between polls of a long stream
+        db.session.close()
+        return events
+
+    def prune(self, older_than):
+        result = db.session.execute(db.delete(Event).where(Event.created_at < older_than))
+        db.session.commit()
+        return result.rowcount
+
+class MemoryEventLog:
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+
+    def publish(self, kind, discord_id, payload):
+        db.session.info.setdefault('pending_events', []).append((self, kind, discord_id, payload))
+
+    def append(self, kind, discord_id, payload):
+        with self._lock:
+            event_id = self._events[-1]["id"] + 1 if self._events else 1
+            self._events.append({"id": event_id, "kind": kind, "discord_id": discord_id, "payload": payload,
+                                 "created_at": datetime.utcnow()})
+
+    def latest_id(self):
+        with self._lock:
+            return self._events[-1]["id"] if self._events else 0
+
+    def read(self, after, limit):
+        with self._lock:
+            return [
+                {key: event[key] for key in ("id", "kind", "discord_id", "payload")}
+                for event in self._events if event["id"] > after
+            ][:limit]
+
+    def prune(self, older_than):
+        with self._lock:
+            kept = [event for event in self._events if event["created_at"] >= older_than]
+            pruned = len(self._events) - len(kept)
+            self._events = kept
+        return pruned
+
+@event.listens_for(Session, 'after_commit')
+def _append_pending_events(session):
+    for log, kind, discord_id, payload in session.info.pop('pending_events', []):
+        log.append(kind, discord_id, payload)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_pending_events(session, previous_transaction):
+    session.info.pop('pending_events', None)
+
+EVENT_LOGS = {
+    'database': DatabaseEventLog,
+    'memory': MemoryEventLog,
+}
+
+def init_app(app):
+    app.config.setdefault('EVENT_LOG', 'database')
+    app.extensions['event_log'] = EVENT_LOGS[app.config['EVENT_LOG']]()
+
+def event_log():
+    return current_app.extensions['event_log']
+
+def publish(kind, discord_id, payload):
+    """
+    Records an event. It becomes visible when the caller commits.
+    """
+    event_log().publish(kind, discord_id, payload)
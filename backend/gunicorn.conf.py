@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for serving the backend. Every value can be tuned through the environment:
+
+    WEB_CONCURRENCY    worker processes (default: 2 x CPUs + 1)
+    GUNICORN_THREADS   threads per worker (default: 4)
+    GUNICORN_TIMEOUT   seconds before a stuck worker is restarted (default: 30)
+    BIND               address to listen on (default: 0.0.0.0:5000)
+
+With PROMETHEUS_MULTIPROC_DIR set, /metrics adds up the numbers of every worker (see metrics.py).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads let one worker overlap requests that wait on the database
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+keepalive = 5
+# Recycle workers now and then so a slow leak can't grow without bound
+max_requests = 1000
+max_requests_jitter = 100
+accesslog = '-'
+
+def on_starting(server):
+    # Runs once in the master before any worker is forked
+    from app import create_app
+    import migrations
+    from models import db
+
+    app = create_app({'AUTO_MIGRATE': False})
+    with app.app_context():
+        applied = migrations.upgrade(db.engine)
+        db.engine.dispose()
+    if applied:
+        server.log.info(f"Applied migrations: {applied}")
+
+def child_exit(server, worker):
+    # Let prometheus_client clean up after a worker that exited
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,276 @@
+"""
+A durable background job queue in the jobs table.
+
+Work too slow for a request is enqueued in the caller's transaction, so a job exists exactly
+when the change that asked for it was committed:
+
+    jobs.enqueue('prune_events', key='prune_events:2024-05-01T10')
+
+and run by worker processes (python worker.py), any number of them. A worker leases a due job
+for JOB_LEASE_SECONDS (300) by flipping it from queued to running with a conditional UPDATE,
+so only one worker gets it. A job whose worker died is taken over once the lease runs out. A
+failed job is retried up to max_attempts times (default JOB_MAX_ATTEMPTS, 5) with exponential
+backoff, then marked failed with its last error. Delivery is at least once, so handlers must
+be safe to run again and should finish well within the lease.
+
+An idempotency key makes enqueueing the same work twice add one job; keys are remembered
+until the finished job is pruned after JOB_RETENTION_HOURS (168).
+
+Each job's run time, outcome and wait past its due time are recorded as Prometheus metrics.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from prometheus_client import Counter, Histogram
+
+from events import event_log
+from metrics import LATENCY_BUCKETS
+from models import db, Job
+from sync import TOMBSTONE_RETENTION, prune_tombstones
+
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '300'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_BACKOFF_SECONDS = float(os.getenv('JOB_BACKOFF_SECONDS', '10'))
+JOB_MAX_BACKOFF_SECONDS = float(os.getenv('JOB_MAX_BACKOFF_SECONDS', '3600'))
+JOB_RETENTION = timedelta(hours=int(os.getenv('JOB_RETENTION_HOURS', '168')))
+EVENT_RETENTION = timedelta(hours=int(os.getenv('EVENT_RETENTION_HOURS', '48')))
+# Due jobs a worker tries to lease per poll before concluding that others got them all
+CLAIM_CANDIDATES = 5
+
+JOB_BUCKETS = LATENCY_BUCKETS + (30, 60, 300, 900)
+JOBS_FINISHED = Counter('jobs_total', "Job runs by outcome (done, retry, failed)", ['kind', 'outcome'])
+JOB_DURATION = Histogram('job_duration_seconds', "Time spent running a job", ['kind'], buckets=JOB_BUCKETS)
+JOB_DELAY = Histogram('job_queue_delay_seconds', "Time from a job being due to a worker starting it",
+                      ['kind'], buckets=JOB_BUCKETS)
+
+logger = logging.getLogger('nosy_canary.jobs')
+
+HANDLERS = {}
+
+def handler(kind):
+    """
+    Registers fn(**payload) as the handler for jobs of `kind`.
+    """
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+def _insert_statement(dialect):
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(Job)
+
+def enqueue(kind, payload=None, key=None, run_at=None, max_attempts=None):
+    """
+    Adds a job, due at `run_at` (default: now), in the caller's transaction. With `key`, does
+    nothing if a job with that idempotency key exists. Returns whether a job was added.
+    """
+    now = datetime.utcnow()
+    values = dict(kind=kind, payload=json.dumps(payload or {}), idempotency_key=key, status='queued',
+                  attempts=0, max_attempts=max_attempts or JOB_MAX_ATTEMPTS, run_at=run_at or now, created_at=now)
+    stmt = _insert_statement(db.engine.dialect.name)
+    if stmt is not None:
+        stmt = stmt.values(**values).on_conflict_do_nothing(index_elements=['idempotency_key'])
+        return db.session.execute(stmt).rowcount == 1
+
+    # No native upsert: a concurrent duplicate fails on the unique key instead
+    if key is not None and db.session.execute(db.select(Job.id).where(Job.idempotency_key == key)).first():
+        return False
+    db.session.execute(db.insert(Job).values(**values))
+    return True
+
+def backoff(attempts):
+    """
+    Seconds before retrying a job that has failed `attempts` times, with jitter so jobs
+    that failed together don't retry together.
+    """
+    delay = min(JOB_MAX_BACKOFF_SECONDS, JOB_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+class Worker:
+    """
+    Runs jobs on `concurrency` threads, each leasing and running one job at a time.
+    """
+
+    def __init__(self, app, concurrency=4, lease_seconds=JOB_LEASE_SECONDS, poll_seconds=1.0, name=None):
+        self.app = app
+        self.concurrency = concurrency
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_seconds = poll_seconds
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+            for n in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def run(self):
+        """
+        Starts the threads and blocks until stop() is called and running jobs have finished.
+        """
+        self.start()
+        for thread in self._threads:
+            # A timeout keeps the main thread responsive to signals
+            while thread.is_alive():
+                thread.join(1)
+
+    def stop(self):
+        self._stopping.set()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.claim()
+            except Exception:
+                logger.exception("Could not lease a job")
+                job = None
+            if job is None:
+                self._stopping.wait(self.poll_seconds)
+                continue
+            try:
+                self.execute(job)
+            except Exception:
+                # Recording the outcome failed; the job is run again once its lease runs out
+                logger.exception("Could not record the outcome of job %s (%s)", job.id, job.kind)
+                with self.app.app_context():
+                    db.session.rollback()
+                self._stopping.wait(self.poll_seconds)
+
+    def claim(self):
+        """
+        Leases the oldest due job (or one whose lease ran out) and returns it, or None.
+        """
+        with self.app.app_context():
+            now = datetime.utcnow()
+            due = db.or_(
+                db.and_(Job.status == 'queued', Job.run_at <= now),
+                db.and_(Job.status == 'running', Job.leased_until < now),
+            )
+            candidates = db.session.execute(
+                db.select(Job.id).where(due).order_by(Job.run_at).limit(CLAIM_CANDIDATES)
+            ).scalars().all()
+            for job_id in candidates:
+                # Re-checks `due`: if another worker leased it first, no row matches
+                leased = db.session.execute(
+                    db.update(Job).where(Job.id == job_id, due).values(
+                        status='running', lease_owner=self.name, leased_until=now + self.lease,
+                        attempts=Job.attempts + 1,
+                    )
+                ).rowcount
+                if leased:
+                    job = db.session.execute(
+                        db.select(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.run_at)
+                        .where(Job.id == job_id)
+                    ).first()
+                    db.session.commit()
+                    return job
+            db.session.rollback()
+            return None
+
+    def execute(self, job):
+        JOB_DELAY.labels(job.kind).observe(max(0.0, (datetime.utcnow() - job.run_at).total_seconds()))
+        started = time.perf_counter()
+        error = None
+        try:
+            if job.attempts > job.max_attempts:
+                # Only reachable when workers keep dying mid-job and leases expire
+                raise RuntimeError(f"lease expired {job.attempts - 1} times")
+            fn = HANDLERS.get(job.kind)
+            if fn is None:
+                raise LookupError(f"no handler for job kind {job.kind!r}")
+            with self.app.app_context():
+                fn(**json.loads(job.payload))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.exception("Job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts)
+        JOB_DURATION.labels(job.kind).observe(time.perf_counter() - started)
+
+        if error is None:
+            outcome, values = 'done', dict(status='done', finished_at=datetime.utcnow())
+        elif job.attempts < job.max_attempts:
+            outcome, values = 'retry', dict(status='queued', last_error=error,
+                                            run_at=datetime.utcnow() + timedelta(seconds=backoff(job.attempts)))
+        else:
+            outcome, values = 'failed', dict(status='failed', last_error=error, finished_at=datetime.utcnow())
+        JOBS_FINISHED.labels(job.kind, outcome).inc()
+
+        with self.app.app_context():
+            # A job that outran its lease may belong to another worker now; leave it to them
+            db.session.execute(
+                db.update(Job).where(Job.id == job.id, Job.lease_owner == self.name, Job.status == 'running')
+                .values(lease_owner=None, leased_until=None, **values)
+            )
+            db.session.commit()
+
+# Built-in jobs, enqueued periodically by scheduler.py
+
+@handler('prune_events')
+def prune_events():
+    pruned = event_log().prune(datetime.utcnow() - EVENT_RETENTION)
+    if pruned:
+        logger.info("Pruned %s old events", pruned)
+
+@handler('prune_tombstones')
+def prune_old_tombstones():
+    pruned = prune_tombstones(datetime.utcnow() - TOMBSTONE_RETENTION)
+    if pruned:
+        logger.info("Pruned %s old tombstones", pruned)
+
+@handler('prune_jobs')
+def prune_jobs():
+    result = db.session.execute(
+        db.delete(Job).where(Job.status.in_(['done', 'failed']), Job.finished_at < datetime.utcnow() - JOB_RETENTION)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.info("Pruned %s finished jobs", result.rowcount)
+
+def register_commands(app):
+    jobs_cli = AppGroup('jobs', help="Inspect and feed the background job queue.")
+
+    @jobs_cli.command('status')
+    def status_command():
+        """Show job counts by kind and status, and recent failures."""
+        rows = db.session.execute(
+            db.select(Job.kind, Job.status, db.func.count()).group_by(Job.kind, Job.status).order_by(Job.kind, Job.status)
+        ).all()
+        for kind, status, count in rows:
+            click.echo(f"{kind:<24} {status:<8} {count}")
+        failed = db.session.execute(
+            db.select(Job.id, Job.kind, Job.last_error).where(Job.status == 'failed')
+            .order_by(Job.finished_at.desc()).limit(10)
+        ).all()
+        for job_id, kind, error in failed:
+            click.echo(f"failed #{job_id} {kind}: {error}")
+
+    @jobs_cli.command('enqueue')
+    @click.argument('kind')
+    @click.option('--payload', default='{}', help="JSON object passed to the handler as keyword arguments.")
+    @click.option('--key', help="Idempotency key.")
+    def enqueue_command(kind, payload, key):
+        """Add a job of KIND to the queue."""
+        if kind not in HANDLERS:
+            raise click.ClickException(f"Unknown job kind {kind!r}; known kinds: {', '.join(sorted(HANDLERS))}")
+        added = enqueue(kind, json.loads(payload), key=key)
+        db.session.commit()
+        click.echo("Enqueued." if added else "A job with that key already exists.")
+
+    app.cli.add_command(jobs_cli)
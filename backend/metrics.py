@@ -0,0 +1,157 @@
+"""
+Per-request performance metrics, served in Prometheus format at GET /metrics.
+
+For every request this records the latency, the number of SQL statements and the time
+spent in them (counted through SQLAlchemy engine events), and the request and response
+body sizes, all labelled by method and route rule (/api/tasks/<discord_id>, not the URL).
+
+Under gunicorn every worker keeps its own numbers. Set PROMETHEUS_MULTIPROC_DIR to an
+empty, writable directory before starting gunicorn and /metrics reports the sum over all
+workers instead of whichever worker answered the scrape.
+
+SLOW_REQUEST_SECONDS turns on the slow-request log (slow.log, or SLOW_REQUEST_LOG): every
+request slower than the threshold is logged with each SQL statement it ran and its time,
+which makes N+1 query patterns easy to spot.
+
+The async views in asgi.py run outside Flask, so they count their statements through
+track_sql() and report with record_request(), into the same metrics.
+"""
+import logging
+import os
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+# Statements kept per request for the slow log, so a runaway loop can't exhaust memory
+MAX_LOGGED_STATEMENTS = 200
+
+REQUESTS = Counter('http_requests_total', "Requests handled", ['method', 'route', 'status'])
+LATENCY = Histogram('http_request_duration_seconds', "Time to build the response",
+                    ['method', 'route'], buckets=LATENCY_BUCKETS)
+SQL_QUERIES = Histogram('http_request_sql_queries', "SQL statements run per request",
+                        ['method', 'route'], buckets=QUERY_COUNT_BUCKETS)
+SQL_TIME = Histogram('http_request_sql_duration_seconds', "Time spent in SQL per request",
+                     ['method', 'route'], buckets=LATENCY_BUCKETS)
+REQUEST_SIZE = Histogram('http_request_size_bytes', "Request body size",
+                         ['method', 'route'], buckets=SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', "Response body size (streamed responses are not counted)",
+                          ['method', 'route'], buckets=SIZE_BUCKETS)
+
+slow_logger = logging.getLogger('nosy_canary.slow_requests')
+
+# The SQL counts of the current request in asgi.py's async views, which have no Flask `g`
+_async_sql = ContextVar('request_sql', default=None)
+
+class SqlCounts:
+    """
+    The SQL statements run on behalf of one request, and the time spent in them.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = [] if slow_logger.handlers else None
+
+    def add(self, elapsed, statement):
+        self.queries += 1
+        self.seconds += elapsed
+        if self.statements is not None and len(self.statements) < MAX_LOGGED_STATEMENTS:
+            self.statements.append((elapsed, statement))
+
+def init_app(app):
+    threshold = os.getenv('SLOW_REQUEST_SECONDS')
+    app.config.setdefault('SLOW_REQUEST_SECONDS', float(threshold) if threshold else None)
+    app.config.setdefault('SLOW_REQUEST_LOG', os.getenv('SLOW_REQUEST_LOG', 'slow.log'))
+
+    if app.config['SLOW_REQUEST_SECONDS'] is not None and not slow_logger.handlers:
+        handler = RotatingFileHandler(app.config['SLOW_REQUEST_LOG'], maxBytes=1000000, backupCount=3)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_logger.addHandler(handler)
+        slow_logger.setLevel(logging.WARNING)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+def instrument_engine(engine):
+    """
+    Counts the SQL statements `engine` runs on behalf of the current request.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        # One start time per connection: a connection runs one statement at a time
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finish_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('query_started')
+        sql = g.get('sql') if has_request_context() else _async_sql.get()
+        if sql is not None:
+            sql.add(elapsed, statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def abandon_query(context):
+        # A statement that raises never reaches after_cursor_execute
+        if context.connection is not None:
+            context.connection.info.pop('query_started', None)
+
+def track_sql():
+    """
+    Starts counting the SQL statements of a request served outside Flask, for the rest of
+    the current context (an ASGI request's task). Returns the SqlCounts for record_request().
+    """
+    sql = SqlCounts()
+    _async_sql.set(sql)
+    return sql
+
+def record_request(app, method, route, path, status, elapsed, sql, request_size, response_size):
+    """
+    Records a finished request in the metrics, and in the slow-request log when it took longer
+    than SLOW_REQUEST_SECONDS. `response_size` is None for a streamed response.
+    """
+    REQUESTS.labels(method, route, status).inc()
+    LATENCY.labels(method, route).observe(elapsed)
+    SQL_QUERIES.labels(method, route).observe(sql.queries)
+    SQL_TIME.labels(method, route).observe(sql.seconds)
+    REQUEST_SIZE.labels(method, route).observe(request_size)
+    if response_size is not None:
+        RESPONSE_SIZE.labels(method, route).observe(response_size)
+
+    threshold = app.config['SLOW_REQUEST_SECONDS']
+    if threshold is not None and elapsed >= threshold:
+        lines = [f"{method} {path} -> {status} in {elapsed * 1000:.1f} ms, "
+                 f"{sql.queries} SQL statements in {sql.seconds * 1000:.1f} ms"]
+        lines += [f"    {seconds * 1000:8.2f} ms  {' '.join(statement.split())}" for seconds, statement in sql.statements or []]
+        slow_logger.warning('\n'.join(lines))
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql = SqlCounts()
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+    record_request(
+        current_app, request.method, request.url_rule.rule if request.url_rule else 'unmatched',
+        request.full_path.rstrip('?'), response.status_code, time.perf_counter() - g.request_started, g.sql,
+        request.content_length or 0, None if response.is_streamed else response.calculate_content_length() or 0,
+    )
+    return response
+
+# GET /metrics
+# Prometheus text exposition of the metrics above.
+def metrics_view():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
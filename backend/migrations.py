@@ -0,0 +1,296 @@
+"""
+Versioned schema migrations for the backend database.
+
+Each migration is a function that receives a SQLAlchemy connection. Migrations are applied
+once, in order, each in its own transaction, and recorded in the schema_migrations table.
+Migrations describe the tables as they were at that version, so they never import models.py.
+
+    flask db upgrade    # apply pending migrations
+    flask db current    # show the applied version and anything pending
+    flask db check      # fail if anything is pending, without changing the database
+"""
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+
+MIGRATIONS = []
+
+schema_migrations = sa.Table(
+    'schema_migrations', sa.MetaData(),
+    sa.Column('version', sa.Integer, primary_key=True),
+    sa.Column('description', sa.String(256), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+)
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return {row.version for row in conn.execute(sa.select(schema_migrations.c.version))}
+
+def pending_migrations(engine):
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+def unapplied_versions(engine):
+    """
+    The versions still to apply. Unlike pending_migrations it only reads, so it can check
+    a database the process shouldn't change.
+    """
+    with engine.connect() as conn:
+        if not sa.inspect(conn).has_table(schema_migrations.name):
+            return [version for version, _, _ in MIGRATIONS]
+        applied = {row.version for row in conn.execute(sa.select(schema_migrations.c.version))}
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+def upgrade(engine):
+    """
+    Applies every pending migration and returns the list of versions that were applied.
+    """
+    applied = []
+    for version, description, fn in pending_migrations(engine):
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append(version)
+    return applied
+
+def register_commands(app):
+    from models import db
+
+    db_cli = AppGroup('db', help="Manage the database schema.")
+
+    @db_cli.command('upgrade')
+    def upgrade_command():
+        """Apply pending schema migrations."""
+        applied = upgrade(db.engine)
+        if applied:
+            click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+        else:
+            click.echo("Database is up to date.")
+
+    @db_cli.command('current')
+    def current_command():
+        """Show the applied schema version and pending migrations."""
+        pending = pending_migrations(db.engine)
+        applied = [m for m in MIGRATIONS if m not in pending]
+        click.echo(f"Current version: {applied[-1][0] if applied else 'none'}")
+        for version, description, _ in pending:
+            click.echo(f"Pending: {version} {description}")
+
+    @db_cli.command('check')
+    def check_command():
+        """Exit with an error if any migration is pending."""
+        pending = unapplied_versions(db.engine)
+        if pending:
+            raise click.ClickException(f"Pending migrations: {', '.join(str(v) for v in pending)}")
+        click.echo("Database is up to date.")
+
+    app.cli.add_command(db_cli)
+
+
+@migration(1, "Create users, tasks and intentions tables")
+def _initial_tables(conn):
+    metadata = sa.MetaData()
+    sa.Table(
+        'users', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('discord_id', sa.String(64), unique=True, nullable=False),
+        sa.Column('canary_bedtime', sa.String(5), nullable=True),
+    )
+    sa.Table(
+        'tasks', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('description', sa.String(256), nullable=False),
+        sa.Column('status', sa.String(32)),
+        sa.Column('notes', sa.Text, nullable=True),
+    )
+    sa.Table(
+        'intentions', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('text', sa.String(512), nullable=False),
+        sa.Column('timestamp', sa.DateTime),
+    )
+    # checkfirst: databases created earlier by db.create_all() are adopted as they are
+    metadata.create_all(conn, checkfirst=True)
+
+@migration(2, "Index per-user task and intention lookups")
+def _per_user_indexes(conn):
+    metadata = sa.MetaData()
+    tasks = sa.Table('tasks', metadata, sa.Column('user_id', sa.Integer))
+    intentions = sa.Table('intentions', metadata, sa.Column('user_id', sa.Integer), sa.Column('timestamp', sa.DateTime))
+    sa.Index('ix_tasks_user_id', tasks.c.user_id).create(conn, checkfirst=True)
+    # Also covers plain user_id lookups, so intentions needs no separate user_id index
+    sa.Index('ix_intentions_user_id_timestamp', intentions.c.user_id, intentions.c.timestamp).create(conn, checkfirst=True)
+
+@migration(3, "Index tasks for keyset pagination by id and status")
+def _task_pagination_indexes(conn):
+    metadata = sa.MetaData()
+    tasks = sa.Table('tasks', metadata, sa.Column('id', sa.Integer), sa.Column('user_id', sa.Integer), sa.Column('status', sa.String(32)))
+    sa.Index('ix_tasks_user_id_id', tasks.c.user_id, tasks.c.id).create(conn, checkfirst=True)
+    sa.Index('ix_tasks_user_id_status_id', tasks.c.user_id, tasks.c.status, tasks.c.id).create(conn, checkfirst=True)
+    # Both new indexes start with user_id, so the single-column one is redundant
+    sa.Index('ix_tasks_user_id', tasks.c.user_id).drop(conn, checkfirst=True)
+
+def _users_table(metadata):
+    # Just enough of users for ForeignKey('users.id') to resolve. Create only the new table,
+    # not the whole metadata, so this stub is never created.
+    return sa.Table('users', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+@migration(4, "Create prompt_schedule")
+def _prompt_schedule(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    prompt_schedule = sa.Table(
+        'prompt_schedule', metadata,
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('next_prompt_at', sa.DateTime, nullable=False),
+        sa.Column('last_prompt_at', sa.DateTime, nullable=True),
+        sa.Column('updated_at', sa.DateTime, nullable=False),
+        sa.Index('ix_prompt_schedule_updated_at', 'updated_at'),
+    )
+    prompt_schedule.create(conn, checkfirst=True)
+
+@migration(5, "Create events for pushing changes to the bot")
+def _events(conn):
+    metadata = sa.MetaData()
+    sa.Table(
+        'events', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('kind', sa.String(32), nullable=False),
+        sa.Column('discord_id', sa.String(64), nullable=True),
+        sa.Column('payload', sa.Text, nullable=False),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Index('ix_events_created_at', 'created_at'),
+        # AUTOINCREMENT: ids of pruned events are never reused, so cursors stay valid
+        sqlite_autoincrement=True,
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+@migration(6, "Add users.version for conditional GETs")
+def _user_version(conn):
+    conn.execute(sa.text("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+
+@migration(7, "Full-text search index over tasks and intentions (SQLite FTS5)")
+def _search_index(conn):
+    # Other databases search with LIKE (see search.py) and need nothing here
+    if conn.dialect.name != 'sqlite':
+        return
+    try:
+        conn.execute(sa.text(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "owner, title, body, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+        ))
+    except sa.exc.OperationalError:
+        # SQLite built without FTS5; search falls back to LIKE
+        return
+
+    # rowid is id*2 for a task and id*2+1 for an intention. owner ('u<user_id>') is an indexed
+    # token, so a search intersects the user's postings instead of filtering everyone's matches.
+    for statement in [
+        """CREATE TRIGGER search_tasks_insert AFTER INSERT ON tasks BEGIN
+               INSERT INTO search_index (rowid, owner, title, body)
+               VALUES (new.id * 2, 'u' || new.user_id, new.description, coalesce(new.notes, ''));
+           END""",
+        """CREATE TRIGGER search_tasks_update AFTER UPDATE OF user_id, description, notes ON tasks BEGIN
+               DELETE FROM search_index WHERE rowid = old.id * 2;
+               INSERT INTO search_index (rowid, owner, title, body)
+               VALUES (new.id * 2, 'u' || new.user_id, new.description, coalesce(new.notes, ''));
+           END""",
+        """CREATE TRIGGER search_tasks_delete AFTER DELETE ON tasks BEGIN
+               DELETE FROM search_index WHERE rowid = old.id * 2;
+           END""",
+        """CREATE TRIGGER search_intentions_insert AFTER INSERT ON intentions BEGIN
+               INSERT INTO search_index (rowid, owner, title, body)
+               VALUES (new.id * 2 + 1, 'u' || new.user_id, new.text, '');
+           END""",
+        """CREATE TRIGGER search_intentions_update AFTER UPDATE OF user_id, text ON intentions BEGIN
+               DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+               INSERT INTO search_index (rowid, owner, title, body)
+               VALUES (new.id * 2 + 1, 'u' || new.user_id, new.text, '');
+           END""",
+        """CREATE TRIGGER search_intentions_delete AFTER DELETE ON intentions BEGIN
+               DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+           END""",
+        """INSERT INTO search_index (rowid, owner, title, body)
+           SELECT id * 2, 'u' || user_id, description, coalesce(notes, '') FROM tasks""",
+        """INSERT INTO search_index (rowid, owner, title, body)
+           SELECT id * 2 + 1, 'u' || user_id, text, '' FROM intentions""",
+    ]:
+        conn.execute(sa.text(statement))
+
+@migration(8, "Add task timestamps and the daily_stats rollup table")
+def _daily_stats(conn):
+    datetime_type = sa.DateTime().compile(dialect=conn.dialect)
+    conn.execute(sa.text(f"ALTER TABLE tasks ADD COLUMN created_at {datetime_type}"))
+    conn.execute(sa.text(f"ALTER TABLE tasks ADD COLUMN completed_at {datetime_type}"))
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    daily_stats = sa.Table(
+        'daily_stats', metadata,
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('day', sa.Date, primary_key=True),
+        sa.Column('intentions', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('tasks_created', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('tasks_completed', sa.Integer, nullable=False, server_default='0'),
+    )
+    daily_stats.create(conn, checkfirst=True)
+    # Existing intentions are counted by `flask stats backfill`
+
+@migration(9, "Add change sequence numbers and tombstones for incremental sync")
+def _sync(conn):
+    for table in ('tasks', 'intentions'):
+        conn.execute(sa.text(f"ALTER TABLE {table} ADD COLUMN seq INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(sa.text("ALTER TABLE users ADD COLUMN sync_floor INTEGER NOT NULL DEFAULT 0"))
+    metadata = sa.MetaData()
+    tasks = sa.Table('tasks', metadata, sa.Column('user_id', sa.Integer), sa.Column('seq', sa.Integer))
+    intentions = sa.Table('intentions', metadata, sa.Column('user_id', sa.Integer), sa.Column('seq', sa.Integer))
+    sa.Index('ix_tasks_user_id_seq', tasks.c.user_id, tasks.c.seq).create(conn)
+    sa.Index('ix_intentions_user_id_seq', intentions.c.user_id, intentions.c.seq).create(conn)
+    _users_table(metadata)
+    tombstones = sa.Table(
+        'tombstones', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('kind', sa.String(32), nullable=False),
+        sa.Column('object_id', sa.Integer, nullable=False),
+        sa.Column('seq', sa.Integer, nullable=False),
+        sa.Column('deleted_at', sa.DateTime, nullable=False),
+        sa.Index('ix_tombstones_user_id_seq', 'user_id', 'seq'),
+        sa.Index('ix_tombstones_deleted_at', 'deleted_at'),
+    )
+    tombstones.create(conn, checkfirst=True)
+
+@migration(10, "Create jobs for the background job queue")
+def _jobs(conn):
+    metadata = sa.MetaData()
+    sa.Table(
+        'jobs', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('kind', sa.String(64), nullable=False),
+        sa.Column('payload', sa.Text, nullable=False),
+        sa.Column('idempotency_key', sa.String(128), nullable=True, unique=True),
+        sa.Column('status', sa.String(16), nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False),
+        sa.Column('max_attempts', sa.Integer, nullable=False),
+        sa.Column('run_at', sa.DateTime, nullable=False),
+        sa.Column('lease_owner', sa.String(64), nullable=True),
+        sa.Column('leased_until', sa.DateTime, nullable=True),
+        sa.Column('last_error', sa.Text, nullable=True),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Column('finished_at', sa.DateTime, nullable=True),
+        sa.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    metadata.create_all(conn, checkfirst=True)
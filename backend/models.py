@@ -13,21 +13,105 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     discord_id = db.Column(db.String(64), unique=True, nullable=False)
     canary_bedtime = db.Column(db.String(5), nullable=True)
+    # Bumped by every write to the user's profile, tasks or intentions; read endpoints derive ETags from it
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Sync cursors below this lost tombstones to pruning and must reload (see sync.py)
+    sync_floor = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 class Task(db.Model):
     __tablename__ = 'tasks'
+    # Keyset pagination walks a user's tasks in id order, optionally for one status
+    __table_args__ = (
+        db.Index('ix_tasks_user_id_id', 'user_id', 'id'),
+        db.Index('ix_tasks_user_id_status_id', 'user_id', 'status', 'id'),
+        db.Index('ix_tasks_user_id_seq', 'user_id', 'seq'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     description = db.Column(db.String(256), nullable=False)
     status = db.Column(db.String(32), default='pending')
     notes = db.Column(db.Text, nullable=True)
+    # Set by the write paths (see stats.py); tasks created before these columns existed have none
+    created_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    # The user's version at the task's last change; 0 for tasks untouched since seq was added
+    seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     user = db.relationship('User', backref='tasks', lazy=True)
 
 class Intention(db.Model):
     __tablename__ = 'intentions'
+    # Serves "latest intention for a user" (and plain per-user lookups) without a table scan
+    __table_args__ = (
+        db.Index('ix_intentions_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_intentions_user_id_seq', 'user_id', 'seq'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     text = db.Column(db.String(512), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     user = db.relationship('User', backref='intentions', lazy=True)
 
+
+class PromptSchedule(db.Model):
+    __tablename__ = 'prompt_schedule'
+    # One row per user with a bedtime: when their next prompt is due
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    next_prompt_at = db.Column(db.DateTime, nullable=False)
+    last_prompt_at = db.Column(db.DateTime, nullable=True)
+    # Lets the scheduler process pick up only the rows changed since its last tick
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class Event(db.Model):
+    __tablename__ = 'events'
+    # The id is the cursor clients resume from, so it must only ever grow
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    discord_id = db.Column(db.String(64), nullable=True)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class DailyStats(db.Model):
+    __tablename__ = 'daily_stats'
+    # Per user per UTC day, kept up to date by the write paths so analytics read a few rollup
+    # rows instead of scanning tasks and intentions
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    intentions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tasks_created = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tasks_completed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+    # One row per deleted task or intention, so incremental sync can report deletions
+    __table_args__ = (
+        db.Index('ix_tombstones_user_id_seq', 'user_id', 'seq'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    object_id = db.Column(db.Integer, nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    # Workers look for the oldest due job of a status (see jobs.py)
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    # Enqueueing twice with the same key adds one job
+    idempotency_key = db.Column(db.String(128), unique=True, nullable=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lease_owner = db.Column(db.String(64), nullable=True)
+    leased_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
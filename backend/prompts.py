@@ -0,0 +1,252 @@
+"""
+Per-user prompt scheduling.
+
+Every user with a canary_bedtime ("HH:MM", UTC) is prompted once a day at that time. The
+next fire time of each user is stored in the prompt_schedule table: web requests keep it up
+to date as bedtimes and intentions change, and GET /api/timer reads it by primary key.
+
+The scheduler process mirrors the table in a min-heap (PromptIndex), so each tick only pops
+the users that are due instead of scanning every user. On restart the heap is rebuilt from
+the table, and prompts missed by more than PROMPT_MISFIRE_GRACE_SECONDS are skipped rather
+than all fired at once.
+"""
+import heapq
+import os
+import re
+from datetime import datetime, timedelta
+
+from events import publish
+from models import db, User, PromptSchedule
+
+# An intention recorded this long before a prompt makes that prompt unnecessary
+PROMPT_SKIP_WINDOW = timedelta(hours=int(os.getenv('PROMPT_SKIP_WINDOW_HOURS', '12')))
+PROMPT_MISFIRE_GRACE = timedelta(seconds=int(os.getenv('PROMPT_MISFIRE_GRACE_SECONDS', '300')))
+# Re-read rows changed slightly before the last sync, in case web and scheduler clocks differ
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def parse_bedtime(value):
+    """
+    Returns (hour, minute) for an "HH:MM" string, or None if it is not a valid time.
+    """
+    match = re.fullmatch(r'(\d{2}):(\d{2})', value or '')
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+def next_prompt_time(bedtime, after):
+    """
+    Returns the first time of day `bedtime` strictly after `after`.
+    """
+    hour, minute = parse_bedtime(bedtime)
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= after:
+        candidate += timedelta(days=1)
+    return candidate
+
+def _upsert_statement(dialect):
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(PromptSchedule)
+
+def schedule_user(user_id, bedtime, now=None):
+    """
+    Creates, moves or removes a user's schedule row after their bedtime changed, and returns
+    the next prompt time (None without a bedtime). Runs in the caller's transaction.
+
+    It upserts, so two requests setting the same user's bedtime at once can't both insert.
+    """
+    now = now or datetime.utcnow()
+    if parse_bedtime(bedtime) is None:
+        db.session.execute(db.delete(PromptSchedule).where(PromptSchedule.user_id == user_id))
+        return None
+
+    next_at = next_prompt_time(bedtime, now)
+    values = dict(next_prompt_at=next_at, updated_at=now)
+    stmt = _upsert_statement(db.engine.dialect.name)
+    if stmt is not None:
+        stmt = stmt.values(user_id=user_id, **values)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['user_id'], set_=values))
+        return next_at
+
+    # No native upsert: update, and insert when there was no row yet
+    result = db.session.execute(db.update(PromptSchedule).where(PromptSchedule.user_id == user_id).values(**values))
+    if result.rowcount == 0:
+        db.session.execute(db.insert(PromptSchedule).values(user_id=user_id, **values))
+    return next_at
+
+def record_intention(user_id, timestamp):
+    """
+    Skips the upcoming prompt when the user has just recorded an intention for it.
+    Runs in the caller's transaction.
+    """
+    row = db.session.get(PromptSchedule, user_id)
+    if row is not None and row.next_prompt_at - PROMPT_SKIP_WINDOW <= timestamp < row.next_prompt_at:
+        row.next_prompt_at += timedelta(days=1)
+        row.updated_at = datetime.utcnow()
+
+class PromptIndex:
+    """
+    A min-heap of (next_prompt_at, user_id) plus a dict holding each user's current time.
+    Moving or removing a user leaves its old heap entry behind; stale entries are skipped
+    when they reach the top, and the heap is rebuilt once they outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due_at = {}
+
+    def __len__(self):
+        return len(self._due_at)
+
+    def get(self, user_id):
+        return self._due_at.get(user_id)
+
+    def set(self, user_id, when):
+        if self._due_at.get(user_id) == when:
+            return
+        self._due_at[user_id] = when
+        heapq.heappush(self._heap, (when, user_id))
+        self._compact()
+
+    def remove(self, user_id):
+        self._due_at.pop(user_id, None)
+        self._compact()
+
+    def pop_due(self, now):
+        """
+        Removes and returns {user_id: due_at} for every user due at or before `now`.
+        """
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            when, user_id = heapq.heappop(self._heap)
+            if self._due_at.get(user_id) == when:
+                due[user_id] = self._due_at.pop(user_id)
+        return due
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._due_at) + 64:
+            self._heap = [(when, user_id) for user_id, when in self._due_at.items()]
+            heapq.heapify(self._heap)
+
+class PromptScheduler:
+    """
+    Fires due prompts from the scheduler process. Each fired prompt is published as a
+    'prompt' event (see events.py) in the same transaction that advances the schedule.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.index = PromptIndex()
+        self._synced_until = None
+
+    def load(self, now=None):
+        """
+        Rebuilds the index from prompt_schedule. Users with a bedtime but no row get one, and
+        prompts missed while the scheduler was down are moved to their next occurrence.
+        """
+        now = now or datetime.utcnow()
+        with self.app.app_context():
+            missing = db.session.execute(
+                db.select(User.id, User.canary_bedtime)
+                .outerjoin(PromptSchedule, PromptSchedule.user_id == User.id)
+                .where(User.canary_bedtime.isnot(None), PromptSchedule.user_id.is_(None))
+            ).all()
+            for user_id, bedtime in missing:
+                schedule_user(user_id, bedtime, now)
+
+            stale = db.session.execute(
+                db.select(PromptSchedule.user_id, User.canary_bedtime)
+                .join(User, User.id == PromptSchedule.user_id)
+                .where(PromptSchedule.next_prompt_at < now - PROMPT_MISFIRE_GRACE)
+            ).all()
+            for user_id, bedtime in stale:
+                schedule_user(user_id, bedtime, now)
+            db.session.commit()
+
+            self.index = PromptIndex()
+            for user_id, next_at in db.session.execute(
+                db.select(PromptSchedule.user_id, PromptSchedule.next_prompt_at)
+            ):
+                self.index.set(user_id, next_at)
+            self._synced_until = now
+
+        self.app.logger.info(
+            f"Prompt index loaded: {len(self.index)} users, {len(missing)} added, {len(stale)} missed prompts skipped"
+        )
+
+    def sync(self, now):
+        """
+        Applies rows the web workers changed since the last sync to the index.
+        """
+        rows = db.session.execute(
+            db.select(PromptSchedule.user_id, PromptSchedule.next_prompt_at)
+            .where(PromptSchedule.updated_at >= self._synced_until - SYNC_OVERLAP)
+        ).all()
+        for user_id, next_at in rows:
+            self.index.set(user_id, next_at)
+        # Rows deleted because a bedtime was cleared leave nothing to sync; tick() drops
+        # those users when they come due and have no row
+        self._synced_until = now
+
+    def tick(self, now=None):
+        """
+        Fires every due prompt and schedules each of those users' next one.
+        """
+        now = now or datetime.utcnow()
+        if self._synced_until is None:
+            self.load(now)
+        with self.app.app_context():
+            self.sync(now)
+
+            due = self.index.pop_due(now)
+            if not due:
+                return []
+
+            # The heap only moves on once the commit succeeds; until then due users keep their old times
+            moves = {}
+            fired = []
+            try:
+                rows = db.session.execute(
+                    db.select(PromptSchedule.user_id, PromptSchedule.next_prompt_at, User.canary_bedtime, User.discord_id)
+                    .join(User, User.id == PromptSchedule.user_id)
+                    .where(PromptSchedule.user_id.in_(due))
+                ).all()
+
+                for user_id, next_at, bedtime, discord_id in rows:
+                    if next_at != due[user_id] or parse_bedtime(bedtime) is None:
+                        # Moved by a web request after our last sync; keep the table's time
+                        if parse_bedtime(bedtime) is not None:
+                            moves[user_id] = next_at
+                        continue
+
+                    following = next_prompt_time(bedtime, now)
+                    # Only advance the row if nobody changed it meanwhile
+                    result = db.session.execute(
+                        db.update(PromptSchedule)
+                        .where(PromptSchedule.user_id == user_id, PromptSchedule.next_prompt_at == next_at)
+                        .values(next_prompt_at=following, last_prompt_at=now, updated_at=now)
+                    )
+                    if result.rowcount:
+                        publish('prompt', discord_id, {"due_at": next_at.isoformat(), "next_prompt_at": following.isoformat()})
+                        fired.append(user_id)
+                        moves[user_id] = following
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Put everyone back as they were, so the next tick tries them again
+                for user_id, next_at in due.items():
+                    self.index.set(user_id, next_at)
+                raise
+            for user_id, next_at in moves.items():
+                self.index.set(user_id, next_at)
+
+        if fired:
+            self.app.logger.info(f"Fired {len(fired)} prompts")
+        return fired
@@ -0,0 +1,109 @@
+"""
+Per-user token-bucket rate limiting.
+
+Every request that names a user (a discord_id in the URL or JSON body) takes a token from
+that user's bucket for its scope: GET requests from the 'read' bucket, everything else from
+the 'write' bucket. PUT and DELETE /api/tasks/<task_id> only name a task and are charged to
+a bucket for that task, since finding its owner would cost a query per request. A bucket holds up to `burst`
+tokens and refills at `per_minute` tokens a minute. An empty bucket answers 429 with a
+Retry-After header.
+
+    RATE_LIMIT_ENABLED             '0' turns limiting off (default: on)
+    RATE_LIMIT_READS_PER_MINUTE    default 600, burst RATE_LIMIT_READ_BURST (60)
+    RATE_LIMIT_WRITES_PER_MINUTE   default 60, burst RATE_LIMIT_WRITE_BURST (20)
+
+Buckets live in a store chosen with the RATE_LIMIT_STORE setting. The default 'memory'
+store is per process, so under gunicorn each worker enforces the limits separately; a store
+shared between workers (e.g. Redis) only needs to implement take().
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+
+class MemoryStore:
+    """
+    Buckets in an LRU dict, guarded by a lock. Past `max_keys` the least recently used
+    bucket is dropped; it most likely refilled long ago, and at worst starts over full.
+    """
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at), least recently used first
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """
+        Takes `cost` tokens from the bucket for `key`, which refills at `rate` tokens a second
+        up to `burst`. Returns 0 if the tokens were taken, or the seconds until they will be.
+        """
+        with self._lock:
+            now = self.clock()
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = 0 if tokens >= cost else (cost - tokens) / rate
+            self._buckets[key] = (tokens - cost if wait == 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+RATE_LIMIT_STORES = {
+    'memory': MemoryStore,
+}
+
+def init_app(app):
+    app.config.setdefault('RATE_LIMIT_ENABLED', os.getenv('RATE_LIMIT_ENABLED', '1') != '0')
+    app.config.setdefault('RATE_LIMIT_STORE', 'memory')
+    app.config.setdefault('RATE_LIMITS', {
+        'read': (int(os.getenv('RATE_LIMIT_READS_PER_MINUTE', '600')), int(os.getenv('RATE_LIMIT_READ_BURST', '60'))),
+        'write': (int(os.getenv('RATE_LIMIT_WRITES_PER_MINUTE', '60')), int(os.getenv('RATE_LIMIT_WRITE_BURST', '20'))),
+    })
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return
+    app.extensions['rate_limit_store'] = RATE_LIMIT_STORES[app.config['RATE_LIMIT_STORE']]()
+    app.before_request(limit_request)
+
+def request_subject():
+    """
+    Who a request is charged to: the discord_id it acts for, 'task:<task_id>' for requests
+    that only name a task, or None for requests that aren't about one user.
+    """
+    view_args = request.view_args or {}
+    if 'discord_id' in view_args:
+        return view_args['discord_id']
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and isinstance(body.get('discord_id'), str):
+            return body['discord_id']
+    if 'task_id' in view_args:
+        return f"task:{view_args['task_id']}"
+    return None
+
+def take_token(app, scope, subject):
+    """
+    Charges one request to the bucket of `subject` (a discord_id) for `scope`. Returns 0, or the seconds to wait
+    before retrying. Always 0 when limiting is off.
+    """
+    store = app.extensions.get('rate_limit_store')
+    if store is None:
+        return 0
+    per_minute, burst = app.config['RATE_LIMITS'][scope]
+    return store.take(f"{scope}:{subject}", per_minute / 60, burst)
+
+def limit_request():
+    subject = request_subject()
+    if subject is None:
+        return None
+    scope = 'read' if request.method in ('GET', 'HEAD') else 'write'
+    wait = take_token(current_app, scope, subject)
+    if wait == 0:
+        return None
+    response = jsonify({"error": "Too many requests, slow down"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
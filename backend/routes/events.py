@@ -0,0 +1,65 @@
+import json
+import os
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from events import event_log
+
+bp = Blueprint('events', __name__, url_prefix='/api')
+
+MAX_BATCH_SIZE = 500
+POLL_SECONDS = float(os.getenv('EVENTS_POLL_SECONDS', '1'))
+KEEPALIVE_SECONDS = 15
+# A stream ends after this long and the client reconnects with Last-Event-ID, so one
+# client never pins a worker thread forever
+STREAM_SECONDS = int(os.getenv('EVENTS_STREAM_SECONDS', '300'))
+
+def _start_cursor():
+    # Resume after Last-Event-ID (sent by reconnecting SSE clients) or ?after=; a client
+    # with no cursor starts at the newest event instead of replaying the whole history
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        return int(cursor) if cursor is not None else event_log().latest_id()
+    except ValueError:
+        return None
+
+# GET /api/events?after=<cursor>&limit=<n>
+# Returns the next batch of events after the cursor, for clients that poll.
+@bp.route('/events', methods=['GET'])
+def get_events():
+    after = _start_cursor()
+    if after is None:
+        return jsonify({"error": "after must be an integer event id"}), 400
+    limit = min(request.args.get('limit', 100, type=int), MAX_BATCH_SIZE)
+
+    events = event_log().read(after, limit)
+    return jsonify({"events": events, "cursor": events[-1]["id"] if events else after}), 200
+
+# GET /api/events/stream
+# Server-Sent Events. Each message is a JSON list of events whose SSE id is the last event's id.
+@bp.route('/events/stream', methods=['GET'])
+def stream_events():
+    after = _start_cursor()
+    if after is None:
+        return jsonify({"error": "Last-Event-ID must be an integer event id"}), 400
+    limit = min(request.args.get('limit', 100, type=int), MAX_BATCH_SIZE)
+    log = event_log()
+
+    def generate(cursor):
+        yield "retry: 2000\n\n"
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < STREAM_SECONDS:
+            events = log.read(cursor, limit)
+            if events:
+                cursor = events[-1]["id"]
+                last_sent = time.monotonic()
+                yield f"id: {cursor}\nevent: batch\ndata: {json.dumps(events)}\n\n"
+                # A full batch means more are waiting, so read again straight away
+                if len(events) == limit:
+                    continue
+            elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            time.sleep(POLL_SECONDS)
+
+    return Response(stream_with_context(generate(after)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
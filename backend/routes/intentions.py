@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify
-from models import db, User, Intention
+from models import db, Intention
+from cache import bump_user_version, conditional_response, resolve_user_id, resolve_user_version
+from prompts import record_intention
+import stats
+from coalesce import commit_write
+from serializers import INTENTION
 from datetime import datetime
 
 bp = Blueprint('intentions', __name__, url_prefix='/api')
@@ -8,23 +13,103 @@ bp = Blueprint('intentions', __name__, url_prefix='/api')
 # Returns the user's latest intention by timestamp.
 @bp.route('/intentions/<discord_id>', methods=['GET'])
 def get_latest_intention(discord_id):
-    user = User.query.filter_by(discord_id=discord_id).first()
-    if not user:
+    user = resolve_user_version(discord_id)
+    if user is None:
         return jsonify({"error": "User not found"}), 404
+    user_id, version = user
 
+    def build():
+        return latest_body(db.session.execute(latest_query(user_id)).first(), user_id), 200
+
+    return conditional_response(user_id, version, build)
+
+def latest_query(user_id):
     # Order intentions by timestamp (descending) to get the latest one
-    latest_intention = Intention.query.filter_by(user_id=user.id).order_by(Intention.timestamp.desc()).first()
+    return INTENTION.select().where(Intention.user_id == user_id).order_by(Intention.timestamp.desc()).limit(1)
 
+def latest_body(latest_intention, user_id):
     if not latest_intention:
         # Return a message if the user has no intentions
-        return jsonify({"message": "No intentions found for this user"}), 200
-    
-    return jsonify({
-        "id": latest_intention.id,
-        "text": latest_intention.text,
-        "timestamp": latest_intention.timestamp.isoformat(),
-        "user_id": user.id
-    }), 200
+        return {"message": "No intentions found for this user"}
+    return {**INTENTION.dump(latest_intention), "user_id": user_id}
+
+DEFAULT_HISTORY_SIZE = 50
+MAX_HISTORY_SIZE = 200
+
+def parse_cursor(cursor):
+    """
+    Splits a history cursor ("<timestamp>,<id>" of the last intention on a page) into its parts.
+    """
+    try:
+        timestamp, intention_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(timestamp), int(intention_id)
+    except ValueError:
+        return None
+
+def parse_history_args(args):
+    """
+    Validates get_intention_history's query parameters. Returns ((limit, since, until, cursor), None)
+    or (None, error message).
+    """
+    limit = args.get('limit', DEFAULT_HISTORY_SIZE, type=int)
+    if not 1 <= limit <= MAX_HISTORY_SIZE:
+        return None, f"limit must be between 1 and {MAX_HISTORY_SIZE}"
+    try:
+        since = datetime.fromisoformat(args['since']) if 'since' in args else None
+        until = datetime.fromisoformat(args['until']) if 'until' in args else None
+    except ValueError:
+        return None, "since and until must be ISO dates or datetimes"
+    cursor = None
+    if 'cursor' in args:
+        cursor = parse_cursor(args['cursor'])
+        if cursor is None:
+            return None, "Invalid cursor"
+    return (limit, since, until, cursor), None
+
+def history_query(user_id, limit, since, until, cursor):
+    # Keyset pagination over (timestamp, id), served by ix_intentions_user_id_timestamp
+    query = INTENTION.select().where(Intention.user_id == user_id)
+    if since is not None:
+        query = query.where(Intention.timestamp >= since)
+    if until is not None:
+        query = query.where(Intention.timestamp < until)
+    if cursor is not None:
+        timestamp, intention_id = cursor
+        query = query.where(db.or_(
+            Intention.timestamp < timestamp,
+            db.and_(Intention.timestamp == timestamp, Intention.id < intention_id)
+        ))
+    # One extra row tells whether another page follows
+    return query.order_by(Intention.timestamp.desc(), Intention.id.desc()).limit(limit + 1)
+
+def history_page(rows, limit):
+    intentions = [INTENTION.dump(row) for row in rows[:limit]]
+    next_cursor = f"{intentions[-1]['timestamp']},{intentions[-1]['id']}" if len(rows) > limit else None
+    return {"intentions": intentions, "next_cursor": next_cursor}
+
+# GET /api/intentions/<discord_id>/history
+# Returns the user's intentions, newest first, one page at a time.
+# Query parameters:
+#   since, until  ISO dates or datetimes bounding the timestamp (since inclusive, until exclusive)
+#   limit         page size (default 50, at most 200)
+#   cursor        the previous page's next_cursor
+@bp.route('/intentions/<discord_id>/history', methods=['GET'])
+def get_intention_history(discord_id):
+    history, error = parse_history_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    limit, since, until, cursor = history
+
+    user = resolve_user_version(discord_id)
+    if user is None:
+        return jsonify({"error": "User not found"}), 404
+    user_id, version = user
+
+    def build():
+        rows = db.session.execute(history_query(user_id, limit, since, until, cursor)).all()
+        return history_page(rows, limit), 200
+
+    return conditional_response(user_id, version, build)
 
 # POST /api/intentions
 # Create a new intention for the user.
@@ -41,14 +126,21 @@ def create_intention():
         return jsonify({"error": "discord_id and text are required"}), 400
 
     # Find the user by discord_id
-    user = User.query.filter_by(discord_id=discord_id).first()
-    if not user:
+    user_id = resolve_user_id(discord_id)
+    if user_id is None:
         return jsonify({"error": "User not found"}), 404
 
-    # Create a new intention
-    intention = Intention(user_id=user.id, text=text, timestamp=datetime.utcnow())
-    db.session.add(intention)
-    db.session.commit()
+    def write():
+        # Create a new intention
+        intention = Intention(user_id=user_id, text=text, timestamp=datetime.utcnow(),
+                              seq=bump_user_version(user_id))
+        db.session.add(intention)
+        record_intention(user_id, intention.timestamp)
+        stats.intention_created(user_id, intention.timestamp)
+        db.session.flush()
+        return intention.id
+
+    intention_id = commit_write(write)
 
-    return jsonify({"message": "Intention created", "intention_id": intention.id}), 201
+    return jsonify({"message": "Intention created", "intention_id": intention_id}), 201
 
@@ -0,0 +1,38 @@
+from flask import Blueprint, request, jsonify
+from cache import conditional_response, resolve_user_version
+from search import search, search_terms
+
+bp = Blueprint('search', __name__, url_prefix='/api')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Ranked pages are addressed by offset; deeper pages than this are better served by a narrower query
+MAX_OFFSET = 1000
+
+# GET /api/search/<discord_id>?q=<query>&limit=<n>&offset=<n>
+# Searches the user's task descriptions, task notes and intentions, best matches first.
+@bp.route('/search/<discord_id>', methods=['GET'])
+def search_user(discord_id):
+    terms = search_terms(request.args.get('q', ''))
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    offset = request.args.get('offset', 0, type=int)
+
+    if not terms:
+        return jsonify({"error": "q must contain at least one word"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    if not 0 <= offset <= MAX_OFFSET:
+        return jsonify({"error": f"offset must be between 0 and {MAX_OFFSET}"}), 400
+
+    user = resolve_user_version(discord_id)
+    if user is None:
+        return jsonify({"error": "User not found"}), 404
+    user_id, version = user
+
+    def build():
+        # Fetch one extra hit to learn whether another page follows
+        hits = search(user_id, terms, limit + 1, offset)
+        next_offset = offset + limit if len(hits) > limit else None
+        return {"results": hits[:limit], "next_offset": next_offset}, 200
+
+    return conditional_response(user_id, version, build)
@@ -0,0 +1,48 @@
+from datetime import date, datetime, timedelta
+from flask import Blueprint, request, jsonify
+from cache import conditional_response, resolve_user_version
+from stats import COUNTERS, daily, streaks
+
+bp = Blueprint('stats', __name__, url_prefix='/api')
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366
+
+# GET /api/stats/<discord_id>?since=YYYY-MM-DD&until=YYYY-MM-DD
+# Daily intention and task counts for a date range (default: the last 30 days, inclusive),
+# their totals, the task completion rate over the range and the user's intention streaks.
+@bp.route('/stats/<discord_id>', methods=['GET'])
+def get_stats(discord_id):
+    today = datetime.utcnow().date()
+    try:
+        until = date.fromisoformat(request.args['until']) if 'until' in request.args else today
+        since = date.fromisoformat(request.args['since']) if 'since' in request.args \
+            else until - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    except ValueError:
+        return jsonify({"error": "since and until must be dates in YYYY-MM-DD format"}), 400
+    if since > until:
+        return jsonify({"error": "since must not be after until"}), 400
+    if (until - since).days >= MAX_RANGE_DAYS:
+        return jsonify({"error": f"The range can cover at most {MAX_RANGE_DAYS} days"}), 400
+
+    user = resolve_user_version(discord_id)
+    if user is None:
+        return jsonify({"error": "User not found"}), 404
+    user_id, version = user
+
+    def build():
+        days = daily(user_id, since, until)
+        totals = {name: sum(day[name] for day in days) for name in COUNTERS}
+        current_streak, longest_streak = streaks(user_id, today)
+        return {
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "days": days,
+            "totals": totals,
+            "completion_rate": totals["tasks_completed"] / totals["tasks_created"] if totals["tasks_created"] else None,
+            "current_streak": current_streak,
+            "longest_streak": longest_streak
+        }, 200
+
+    # The default range and the current streak move at midnight without any write
+    return conditional_response(user_id, version, build, vary=(today,))
@@ -0,0 +1,40 @@
+from flask import Blueprint, request, jsonify
+from models import db, User
+from cache import conditional_response
+from sync import changes
+from routes.tasks import is_valid_discord_id
+
+bp = Blueprint('sync', __name__, url_prefix='/api')
+
+# GET /api/sync/<discord_id>?since=<cursor>
+# Returns what changed in the user's tasks and intentions after the cursor:
+#   {"cursor": 42, "reset": false, "tasks": [...], "intentions": [...], "deleted": {"tasks": [ids], "intentions": [ids]}}
+# tasks and intentions hold the full current rows; apply deleted first, then upsert them by id.
+# Pass the returned cursor as `since` next time. Without `since`, or when the cursor is too old
+# or too far behind, the response is {"cursor": n, "reset": true}: reload everything from
+# GET /api/tasks and /api/intentions/<discord_id>/history, then sync from that cursor.
+@bp.route('/sync/<discord_id>', methods=['GET'])
+def get_sync(discord_id):
+    if not is_valid_discord_id(discord_id):
+        return jsonify({"error": "Invalid discord_id format"}), 400
+
+    since = request.args.get('since', type=int)
+    if 'since' in request.args and since is None:
+        return jsonify({"error": "since must be an integer cursor"}), 400
+
+    user = db.session.execute(
+        db.select(User.id, User.version, User.sync_floor).where(User.discord_id == discord_id)
+    ).first()
+    if user is None:
+        return jsonify({"error": "User not found"}), 404
+
+    def build():
+        # A cursor ahead of the version comes from another database (or a restored backup)
+        if since is None or since < user.sync_floor or since > user.version:
+            return {"cursor": user.version, "reset": True}, 200
+        changed = changes(user.id, since, user.version)
+        if changed is None:
+            return {"cursor": user.version, "reset": True}, 200
+        return {"cursor": user.version, "reset": False, **changed}, 200
+
+    return conditional_response(user.id, user.version, build)
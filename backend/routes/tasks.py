@@ -1,10 +1,68 @@
 import re
-from flask import Blueprint, request, jsonify, current_app
-from models import db, User, Task
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from models import db, Task
+from cache import bump_user_version, conditional_response, resolve_user_id, resolve_user_version
+from events import publish
+from coalesce import commit_write
+from serializers import TASK, dumps
+import stats
+from sync import record_deletion
 from sqlalchemy.exc import SQLAlchemyError
 
 bp = Blueprint('tasks', __name__, url_prefix='/api')
 
+ALLOWED_STATUSES = ['pending', 'in-progress', 'completed']
+
+# Fields that can be changed on an existing task, and their validators
+UPDATE_VALIDATORS = {
+    'description': lambda x: isinstance(x, str) and len(x.strip()) > 0,
+    'status': lambda x: x in ALLOWED_STATUSES,
+    'notes': lambda x: isinstance(x, str)
+}
+
+MAX_BATCH_OPERATIONS = 500
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NDJSON_CHUNK_SIZE = 1000
+
+def publish_task_change(discord_id, created=(), updated=(), deleted=()):
+    # One event per request, so a batch reaches the bot as a single change
+    publish('task', discord_id, {"created": list(created), "updated": list(updated), "deleted": list(deleted)})
+
+def is_valid_discord_id(discord_id):
+    return isinstance(discord_id, str) and re.fullmatch(r'\d{17,19}', discord_id) is not None
+
+def validate_new_task(description, status):
+    """
+    Returns an error message for an invalid new task, or None if it is valid.
+    """
+    if not description:
+        return "description is required"
+    if status not in ALLOWED_STATUSES:
+        return f"Invalid status. Allowed statuses are {ALLOWED_STATUSES}"
+    return None
+
+def apply_task_update(task, data):
+    """
+    Validates and applies the allowed fields in `data` to `task`.
+    Returns an error message, or None if at least one field was updated.
+    """
+    updated = False  # Flag to check if any field is updated
+    old_status = task.status
+
+    for field, validator in UPDATE_VALIDATORS.items():
+        if field in data:
+            if not validator(data[field]):
+                return f"Invalid value for '{field}'"
+            setattr(task, field, data[field])
+            updated = True
+
+    if not updated:
+        return "No valid fields provided for update"
+    stats.task_status_changed(task, old_status)
+    return None
+
 # POST /api/tasks - Create a new task
 @bp.route('/tasks', methods=['POST'])
 def create_task():
@@ -20,23 +78,30 @@ def create_task():
             return jsonify({"error": "discord_id and description are required"}), 400
 
         # Validate discord_id format
-        if not re.fullmatch(r'\d{17,19}', discord_id):
+        if not is_valid_discord_id(discord_id):
             return jsonify({"error": "Invalid discord_id format"}), 400
 
         # Validate status
-        allowed_statuses = ['pending', 'in-progress', 'completed']
-        if status not in allowed_statuses:
-            return jsonify({"error": f"Invalid status. Allowed statuses are {allowed_statuses}"}), 400
+        error = validate_new_task(description, status)
+        if error:
+            return jsonify({"error": error}), 400
 
-        user = User.query.filter_by(discord_id=discord_id).first()
-        if not user:
+        user_id = resolve_user_id(discord_id)
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
 
-        task = Task(user_id=user.id, description=description, status=status, notes=notes)
-        db.session.add(task)
-        db.session.commit()
+        def write():
+            seq = bump_user_version(user_id)
+            task = Task(user_id=user_id, description=description, status=status, notes=notes, seq=seq)
+            db.session.add(task)
+            stats.task_created(task)
+            db.session.flush()
+            publish_task_change(discord_id, created=[task.id])
+            return task.id
 
-        return jsonify({"message": "Task created", "task_id": task.id}), 201
+        task_id = commit_write(write)
+
+        return jsonify({"message": "Task created", "task_id": task_id}), 201
 
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -46,29 +111,80 @@ def create_task():
         current_app.logger.error(f"Unexpected error in create_task: {e}")
         return jsonify({"error": "An internal error occurred"}), 500
 
-# GET /api/tasks/<discord_id> - Retrieve all tasks for a user
+def parse_listing_args(args):
+    """
+    Validates get_tasks' query parameters. Returns ((limit, after_id, status, field_names), None)
+    or (None, error message).
+    """
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    after_id = args.get('after_id', type=int)
+    status = args.get('status')
+    fields = args.get('fields')
+
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return None, f"limit must be between 1 and {MAX_PAGE_SIZE}"
+    if status is not None and status not in ALLOWED_STATUSES:
+        return None, f"Invalid status. Allowed statuses are {ALLOWED_STATUSES}"
+
+    field_names = list(TASK.fields) if fields is None else ['id'] + list(dict.fromkeys(
+        name for name in fields.split(',') if name and name != 'id'
+    ))
+    unknown = [name for name in field_names if name not in TASK.fields]
+    if unknown:
+        return None, f"Unknown fields {unknown}. Allowed fields are {list(TASK.fields)}"
+    return (limit, after_id, status, field_names), None
+
+def listing_query(user_id, after_id, status, field_names):
+    # Only the requested columns are loaded, so leaving out notes also skips reading them
+    query = TASK.select(field_names).where(Task.user_id == user_id)
+    if status is not None:
+        query = query.where(Task.status == status)
+    if after_id is not None:
+        query = query.where(Task.id > after_id)
+    return query.order_by(Task.id)
+
+def listing_page(rows, limit, field_names):
+    """
+    The response body for a page fetched with one extra row, which tells whether another page follows.
+    """
+    tasks_list = [TASK.dump(row, field_names) for row in rows[:limit]]
+    next_cursor = tasks_list[-1]['id'] if len(rows) > limit else None
+    return {"tasks": tasks_list, "next_cursor": next_cursor}
+
+# GET /api/tasks/<discord_id> - Retrieve a page of tasks for a user
+# Query parameters:
+#   limit     page size (default 50, at most 200)
+#   after_id  return tasks with an id greater than this (the previous page's next_cursor)
+#   status    only return tasks with this status
+#   fields    comma-separated subset of id,description,status,notes (id is always included)
+#   format    "ndjson" streams every matching task, one JSON object per line, for exports
 @bp.route('/tasks/<discord_id>', methods=['GET'])
 def get_tasks(discord_id):
     try:
         # Validate discord_id format
-        if not re.fullmatch(r'\d{17,19}', discord_id):
+        if not is_valid_discord_id(discord_id):
             return jsonify({"error": "Invalid discord_id format"}), 400
 
-        user = User.query.filter_by(discord_id=discord_id).first()
-        if not user:
+        listing, error = parse_listing_args(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        limit, after_id, status, field_names = listing
+
+        user = resolve_user_version(discord_id)
+        if user is None:
             return jsonify({"error": "User not found"}), 404
+        user_id, version = user
 
-        tasks = Task.query.filter_by(user_id=user.id).all()
-        tasks_list = []
-        for task in tasks:
-            tasks_list.append({
-                "id": task.id,
-                "description": task.description,
-                "status": task.status,
-                "notes": task.notes
-            })
+        query = listing_query(user_id, after_id, status, field_names)
 
-        return jsonify({"tasks": tasks_list}), 200
+        if request.args.get('format') == 'ndjson':
+            return Response(stream_with_context(_ndjson_rows(query, field_names)), mimetype='application/x-ndjson')
+
+        def build():
+            rows = db.session.execute(query.limit(limit + 1)).all()
+            return listing_page(rows, limit, field_names), 200
+
+        return conditional_response(user_id, version, build)
 
     except SQLAlchemyError as e:
         current_app.logger.error(f"Database error in get_tasks: {e}")
@@ -77,6 +193,11 @@ def get_tasks(discord_id):
         current_app.logger.error(f"Unexpected error in get_tasks: {e}")
         return jsonify({"error": "An internal error occurred"}), 500
 
+def _ndjson_rows(query, field_names):
+    # yield_per keeps memory flat: rows are fetched from the cursor in chunks as the response is sent
+    for row in db.session.execute(query.execution_options(yield_per=NDJSON_CHUNK_SIZE)):
+        yield dumps(TASK.dump(row, field_names)) + '\n'
+
 # PUT /api/tasks/<task_id> - Update a specific task
 @bp.route('/tasks/<int:task_id>', methods=['PUT'])
 def update_task(task_id):
@@ -89,25 +210,13 @@ def update_task(task_id):
         if not task:
             return jsonify({"error": "Task not found"}), 404
 
-        # Define allowed fields and their validators
-        allowed_fields = {
-            'description': lambda x: isinstance(x, str) and len(x.strip()) > 0,
-            'status': lambda x: x in ['pending', 'in-progress', 'completed'],
-            'notes': lambda x: isinstance(x, str)
-        }
-
-        updated = False  # Flag to check if any field is updated
-
-        for field, validator in allowed_fields.items():
-            if field in data:
-                if not validator(data[field]):
-                    return jsonify({"error": f"Invalid value for '{field}'"}), 400
-                setattr(task, field, data[field])
-                updated = True
-
-        if not updated:
-            return jsonify({"error": "No valid fields provided for update"}), 400
+        error = apply_task_update(task, data)
+        if error:
+            db.session.rollback()
+            return jsonify({"error": error}), 400
 
+        publish_task_change(task.user.discord_id, updated=[task.id])
+        task.seq = bump_user_version(task.user_id)
         db.session.commit()
         return jsonify({"message": "Task updated successfully"}), 200
 
@@ -127,6 +236,9 @@ def delete_task(task_id):
         if not task:
             return jsonify({"error": "Task not found"}), 404
 
+        publish_task_change(task.user.discord_id, deleted=[task.id])
+        record_deletion(task.user_id, 'task', task.id, bump_user_version(task.user_id))
+        stats.task_deleted(task)
         db.session.delete(task)
         db.session.commit()
 
@@ -140,3 +252,121 @@ def delete_task(task_id):
         current_app.logger.error(f"Unexpected error in delete_task: {e}")
         return jsonify({"error": "An internal error occurred"}), 500
 
+
+# POST /api/tasks/batch - Create, update and delete several tasks in one transaction
+# Expects JSON: {"discord_id": "...", "operations": [
+#     {"op": "create", "description": "...", "status": "pending", "notes": ""},
+#     {"op": "update", "task_id": 1, "status": "completed"},
+#     {"op": "delete", "task_id": 2}
+# ]}
+# Either every operation is applied or none is. The response has one result per operation, in order.
+@bp.route('/tasks/batch', methods=['POST'])
+def batch_tasks():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        discord_id = data.get('discord_id')
+        operations = data.get('operations')
+
+        if not discord_id or not isinstance(operations, list) or not operations:
+            return jsonify({"error": "discord_id and a non-empty operations list are required"}), 400
+
+        if not is_valid_discord_id(discord_id):
+            return jsonify({"error": "Invalid discord_id format"}), 400
+
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return jsonify({"error": f"At most {MAX_BATCH_OPERATIONS} operations are allowed per batch"}), 400
+
+        user_id = resolve_user_id(discord_id)
+        if user_id is None:
+            return jsonify({"error": "User not found"}), 404
+
+        # Load every task touched by an update or delete with a single query, scoped to this user
+        task_ids = [op.get('task_id') for op in operations
+                    if isinstance(op, dict) and op.get('op') in ('update', 'delete')]
+        task_ids = [task_id for task_id in task_ids if isinstance(task_id, int)]
+        tasks_by_id = {}
+        if task_ids:
+            owned = Task.query.filter(Task.user_id == user_id, Task.id.in_(task_ids)).all()
+            tasks_by_id = {task.id: task for task in owned}
+
+        results = []
+        created = []  # (result, task) pairs that need an id once the session is flushed
+        changed_tasks = []  # created or updated, to be stamped with the batch's seq
+        deleted_ids = []
+        failed = False
+
+        for op in operations:
+            kind = op.get('op') if isinstance(op, dict) else None
+            result = {"op": kind}
+            error = None
+
+            if kind == 'create':
+                description = op.get('description')
+                status = op.get('status', 'pending')
+                error = validate_new_task(description, status)
+                if not error:
+                    task = Task(user_id=user_id, description=description, status=status,
+                                notes=op.get('notes', ''))
+                    db.session.add(task)
+                    stats.task_created(task)
+                    created.append((result, task))
+                    changed_tasks.append(task)
+
+            elif kind in ('update', 'delete'):
+                task = tasks_by_id.get(op.get('task_id'))
+                result["task_id"] = op.get('task_id')
+                if task is None:
+                    error = "Task not found"
+                elif kind == 'update':
+                    changes = {field: value for field, value in op.items() if field in UPDATE_VALIDATORS}
+                    error = apply_task_update(task, changes)
+                    changed_tasks.append(task)
+                else:
+                    stats.task_deleted(task)
+                    db.session.delete(task)
+                    deleted_ids.append(task.id)
+                    # A later operation in the same batch can no longer see this task
+                    del tasks_by_id[task.id]
+
+            else:
+                error = "op must be one of 'create', 'update' or 'delete'"
+
+            if error:
+                result["error"] = error
+                failed = True
+            else:
+                result["ok"] = True
+            results.append(result)
+
+        if failed:
+            db.session.rollback()
+            return jsonify({"error": "Batch rejected, no changes were applied", "results": results}), 400
+
+        seq = bump_user_version(user_id)
+        for task in changed_tasks:
+            task.seq = seq
+        for task_id in deleted_ids:
+            record_deletion(user_id, 'task', task_id, seq)
+        db.session.flush()
+        for result, task in created:
+            result["task_id"] = task.id
+
+        changed = {'create': [], 'update': [], 'delete': []}
+        for result in results:
+            changed[result["op"]].append(result["task_id"])
+        publish_task_change(discord_id, created=changed['create'], updated=changed['update'], deleted=changed['delete'])
+        db.session.commit()
+
+        return jsonify({"message": "Batch applied", "results": results}), 200
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in batch_tasks: {e}")
+        return jsonify({"error": "Database error occurred"}), 500
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Unexpected error in batch_tasks: {e}")
+        return jsonify({"error": "An internal error occurred"}), 500
@@ -1,12 +1,30 @@
+from datetime import datetime
 from flask import Blueprint, jsonify
+from models import db, PromptSchedule
+from cache import resolve_user_id
 timer_bp = Blueprint('timer', __name__)
 
 @timer_bp.route('/api/timer/<string:discord_id>', methods=['GET'])
 def get_timer(discord_id):
-    # For now, return a placeholder or simple JSON structure
-    # Later, this can query a database or a global in-memory store for actual timing info
-    return jsonify({
-        'discord_id': discord_id,
-        'next_prompt_in_seconds': 3600  # Example placeholder value
-    }), 200
+    user_id = resolve_user_id(discord_id)
+    if user_id is None:
+        return jsonify({"error": "User not found"}), 404
+
+    # A primary-key read of the row the scheduler fires from; no row means no bedtime is set
+    schedule = db.session.get(PromptSchedule, user_id)
+    return jsonify(timer_body(discord_id, schedule)), 200
 
+def timer_body(discord_id, schedule):
+    if schedule is None:
+        return {
+            'discord_id': discord_id,
+            'next_prompt_at': None,
+            'next_prompt_in_seconds': None
+        }
+
+    seconds = (schedule.next_prompt_at - datetime.utcnow()).total_seconds()
+    return {
+        'discord_id': discord_id,
+        'next_prompt_at': schedule.next_prompt_at.isoformat(),
+        'next_prompt_in_seconds': max(0, int(seconds))
+    }
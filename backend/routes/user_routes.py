@@ -1,17 +1,17 @@
 from flask import Blueprint, request, jsonify
 from models import db, User
+from cache import bump_user_version, conditional_response, invalidate_user
+from prompts import parse_bedtime, schedule_user
+from serializers import USER
 
 user_bp = Blueprint('user_bp', __name__, url_prefix='/api/user')
 
 @user_bp.route('/<discord_id>', methods=['GET'])
 def get_user(discord_id):
-    user = User.query.filter_by(discord_id=discord_id).first()
+    # Only the response's columns (plus the version for the ETag), not a full User
+    user = db.session.execute(USER.select().add_columns(User.version).where(User.discord_id == discord_id)).first()
     if user:
-        return jsonify({
-            'id': user.id,
-            'discord_id': user.discord_id,
-            'canary_bedtime': user.canary_bedtime
-        }), 200
+        return conditional_response(user.id, user.version, lambda: (USER.dump(user), 200))
     return jsonify({'error': 'User not found'}), 404
 
 @user_bp.route('', methods=['POST'])
@@ -23,18 +23,22 @@ def create_or_update_user():
     if not discord_id:
         return jsonify({'error': 'discord_id is required'}), 400
 
+    if canary_bedtime is not None and parse_bedtime(canary_bedtime) is None:
+        return jsonify({'error': 'canary_bedtime must be a time in HH:MM format'}), 400
+
     user = User.query.filter_by(discord_id=discord_id).first()
     if user is None:
         user = User(discord_id=discord_id, canary_bedtime=canary_bedtime)
         db.session.add(user)
+        db.session.flush()
     else:
         user.canary_bedtime = canary_bedtime
 
+    # Keep the prompt schedule in the same transaction as the bedtime it is based on
+    schedule_user(user.id, canary_bedtime)
+    bump_user_version(user.id)
     db.session.commit()
+    invalidate_user(discord_id)
 
-    return jsonify({
-        'id': user.id,
-        'discord_id': user.discord_id,
-        'canary_bedtime': user.canary_bedtime
-    }), 200
+    return jsonify(USER.dump(user)), 200
 
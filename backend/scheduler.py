@@ -1,4 +1,89 @@
+"""
+Periodic background work: firing due canary prompts every PROMPT_TICK_SECONDS (see prompts.py)
+and enqueueing maintenance jobs for the job queue (see jobs.py): pruning old events and
+finished jobs every hour, and old sync tombstones every day. Workers (python worker.py)
+run those jobs.
+
+Web workers never start a scheduler. In production the jobs run in one dedicated process:
+
+    python scheduler.py
+
+A lock file (SCHEDULER_LOCK_FILE) makes a second copy exit instead of running every job twice.
+Apply migrations (flask db upgrade) before starting it.
+The development server (`python app.py`) runs the same jobs in a background thread instead.
+"""
+import os
+import sys
+from datetime import datetime
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+import jobs
+from models import db
+from prompts import PromptScheduler
+
+PROMPT_TICK_SECONDS = int(os.getenv('PROMPT_TICK_SECONDS', '30'))
+
+# (job kind, interval, idempotency key period as a strftime format)
+MAINTENANCE_JOBS = [
+    ('prune_events', {'hours': 1}, '%Y-%m-%dT%H'),
+    ('prune_jobs', {'hours': 1}, '%Y-%m-%dT%H'),
+    ('prune_tombstones', {'days': 1}, '%Y-%m-%d'),
+]
+
+def enqueue_job(app, kind, period):
+    with app.app_context():
+        # The key allows one job per period, however often this fires (restarts, misfires)
+        jobs.enqueue(kind, key=f"{kind}:{datetime.utcnow().strftime(period)}")
+        db.session.commit()
+
+def add_jobs(scheduler, app):
+    prompt_scheduler = PromptScheduler(app)
+    prompt_scheduler.load()
+    # The tick stays here: it works from an in-memory heap of next fire times and only writes
+    # events, so it is cheap and can't be split across workers.
+    # coalesce/max_instances: a slow tick is never stacked up behind itself
+    scheduler.add_job(prompt_scheduler.tick, 'interval', seconds=PROMPT_TICK_SECONDS,
+                      id='prompt_tick', replace_existing=True, coalesce=True, max_instances=1)
+    for kind, interval, period in MAINTENANCE_JOBS:
+        scheduler.add_job(enqueue_job, 'interval', args=[app, kind, period], **interval,
+                          next_run_time=datetime.now(), id=f'enqueue_{kind}', replace_existing=True, coalesce=True)
+    return prompt_scheduler
+
+def start_background_scheduler(app):
+    scheduler = BackgroundScheduler()
+    add_jobs(scheduler, app)
+    scheduler.start()
+    return scheduler
+
+def acquire_lock(path):
+    """
+    Takes an exclusive lock on `path` for the life of the process.
+    Returns the open lock file, or None if another scheduler already holds it.
+    """
+    import fcntl
+
+    lock_file = open(path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+if __name__ == '__main__':
+    from app import create_app, startup
+
+    lock = acquire_lock(os.getenv('SCHEDULER_LOCK_FILE', 'scheduler.lock'))
+    if lock is None:
+        sys.exit("Another scheduler process is already running.")
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+    app = create_app()
+    startup(app)
+    scheduler = BlockingScheduler()
+    add_jobs(scheduler, app)
+    app.logger.info("Scheduler started")
+    scheduler.start()
@@ -0,0 +1,97 @@
+"""
+Full-text search over a user's task descriptions, task notes and intention texts.
+
+On SQLite the search_index FTS5 table (migration 7) is kept in sync with tasks and
+intentions by triggers, and results are ranked with bm25, weighting task descriptions and
+intention texts above notes. Databases without it (PostgreSQL, or SQLite built without
+FTS5) fall back to a LIKE scan of the user's rows, tasks first and newest first.
+"""
+import re
+
+import sqlalchemy as sa
+
+from models import db, Task, Intention
+
+# bm25 weights for the owner, title and body columns
+RANK_WEIGHTS = (0.0, 2.0, 1.0)
+MAX_TERMS = 8
+
+# Engines whose database has the FTS5 index. Only a found index is remembered: a worker that
+# started before migration 7 picks the index up once it exists.
+_has_index = set()
+
+def search_terms(q):
+    """
+    Splits a query into at most MAX_TERMS word terms. Anything that isn't a word character
+    is dropped, so user input can never form FTS5 query syntax.
+    """
+    return re.findall(r'\w+', q.lower())[:MAX_TERMS]
+
+def has_search_index():
+    engine = db.engine
+    if engine not in _has_index and engine.dialect.name == 'sqlite' and db.session.execute(sa.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+    )).first() is not None:
+        _has_index.add(engine)
+    return engine in _has_index
+
+def search(user_id, terms, limit, offset):
+    """
+    Returns up to `limit` hits after skipping `offset`, best first, each as a dict with
+    kind ('task' or 'intention'), id, text, snippet and the task status or intention timestamp.
+    """
+    if has_search_index():
+        hits = _fts_search(user_id, terms, limit, offset)
+    else:
+        hits = _like_search(user_id, terms, limit, offset)
+    _add_details(hits)
+    return hits
+
+def _fts_search(user_id, terms, limit, offset):
+    # Every term must appear in the title or body; the last one also matches as a prefix,
+    # so results show up while a word is still being typed
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    match = f'owner:"u{user_id}" AND {{title body}}: ({" AND ".join(quoted)})'
+    rows = db.session.execute(sa.text(
+        "SELECT rowid, title, snippet(search_index, 1, '**', '**', '…', 12) AS title_snippet, "
+        "snippet(search_index, 2, '**', '**', '…', 12) AS body_snippet, "
+        f"bm25(search_index, {', '.join(str(w) for w in RANK_WEIGHTS)}) AS score "
+        "FROM search_index WHERE search_index MATCH :match "
+        "ORDER BY score LIMIT :limit OFFSET :offset"
+    ), {"match": match, "limit": limit, "offset": offset})
+    return [
+        {"kind": "task" if row.rowid % 2 == 0 else "intention", "id": row.rowid // 2,
+         "text": row.title, "snippet": row.body_snippet if '**' in row.body_snippet else row.title_snippet,
+         "score": -row.score}
+        for row in rows
+    ]
+
+def _like_search(user_id, terms, limit, offset):
+    def contains_all(*columns):
+        return sa.and_(*(sa.or_(*(column.icontains(term, autoescape=True) for column in columns)) for term in terms))
+
+    tasks = db.select(sa.literal('task').label('kind'), Task.id, Task.description.label('text')) \
+        .where(Task.user_id == user_id, contains_all(Task.description, Task.notes))
+    intentions = db.select(sa.literal('intention').label('kind'), Intention.id, Intention.text) \
+        .where(Intention.user_id == user_id, contains_all(Intention.text))
+    matches = sa.union_all(tasks, intentions).subquery()
+    rows = db.session.execute(
+        db.select(matches).order_by(matches.c.kind.desc(), matches.c.id.desc()).limit(limit).offset(offset)
+    )
+    return [{"kind": row.kind, "id": row.id, "text": row.text, "snippet": row.text, "score": None} for row in rows]
+
+def _add_details(hits):
+    # One query per kind for the whole page, not one per hit
+    task_ids = [hit["id"] for hit in hits if hit["kind"] == "task"]
+    intention_ids = [hit["id"] for hit in hits if hit["kind"] == "intention"]
+    statuses = dict(db.session.execute(db.select(Task.id, Task.status).where(Task.id.in_(task_ids))).all()) if task_ids else {}
+    timestamps = dict(db.session.execute(
+        db.select(Intention.id, Intention.timestamp).where(Intention.id.in_(intention_ids))
+    ).all()) if intention_ids else {}
+    for hit in hits:
+        if hit["kind"] == "task":
+            hit["status"] = statuses.get(hit["id"])
+        else:
+            timestamp = timestamps.get(hit["id"])
+            hit["timestamp"] = timestamp.isoformat() if timestamp else None
@@ -0,0 +1,112 @@
+"""
+Response serialization: one schema per model and a compact, fast JSON encoder.
+
+A schema names the columns an API response exposes. Routes select only those columns
+(schema.select()), get lightweight Row tuples back instead of ORM instances, and turn each
+row into a dict with schema.dump(). orjson is used for encoding when it is installed
+(pip install orjson), the stdlib json module otherwise; output is never pretty-printed.
+Both produce the same bytes: keys sorted, as Flask does, and dates in Flask's HTTP date format.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+from models import db, User, Task, Intention
+
+try:
+    import orjson
+    # Datetimes go through the provider's default(), like on the stdlib path
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+except ImportError:
+    orjson = None
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+class Schema:
+    """
+    Maps response field names to columns, with an optional formatter per field:
+
+        Schema(id=Intention.id, timestamp=(Intention.timestamp, _isoformat))
+    """
+
+    def __init__(self, **fields):
+        self.fields = {}
+        self.formatters = {}
+        for name, field in fields.items():
+            if isinstance(field, tuple):
+                field, self.formatters[name] = field
+            self.fields[name] = field
+
+    def columns(self, names=None):
+        return [self.fields[name].label(name) for name in (names or self.fields)]
+
+    def select(self, names=None):
+        """
+        A SELECT of just these fields. Executing it yields Rows, not ORM objects.
+        """
+        return db.select(*self.columns(names))
+
+    def dump(self, row, names=None):
+        """
+        Returns the response dict for a Row (or ORM instance) holding these fields.
+        """
+        body = {}
+        for name in names or self.fields:
+            value = getattr(row, name)
+            formatter = self.formatters.get(name)
+            body[name] = formatter(value) if formatter else value
+        return body
+
+USER = Schema(
+    id=User.id,
+    discord_id=User.discord_id,
+    canary_bedtime=User.canary_bedtime,
+)
+
+TASK = Schema(
+    id=Task.id,
+    description=Task.description,
+    status=Task.status,
+    notes=Task.notes,
+)
+
+INTENTION = Schema(
+    id=Intention.id,
+    text=Intention.text,
+    timestamp=(Intention.timestamp, _isoformat),
+)
+
+def dumps(obj):
+    """
+    Encodes obj as compact JSON and returns str.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, sort_keys=True)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider (behind jsonify) with compact output, encoding with orjson when
+    it is installed. Values orjson can't encode fall back to the stdlib path.
+    """
+    compact = True
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            try:
+                return self._app.response_class(orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS),
+                                                mimetype=self.mimetype)
+            except TypeError:
+                pass
+        return self._app.response_class(super().dumps(obj, separators=(',', ':')), mimetype=self.mimetype)
@@ -0,0 +1,160 @@
+"""
+Daily activity rollups for habit tracking.
+
+daily_stats holds one row per user per UTC day with the number of intentions recorded,
+tasks created and tasks completed that day. The write paths update it in their own
+transaction through the functions below, so streaks and completion rates read a handful of
+rollup rows instead of scanning tasks and intentions.
+
+    flask stats backfill    # rebuild every rollup from the raw tables
+"""
+from datetime import date, datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+
+from models import db, DailyStats, Intention, Task, User
+
+COUNTERS = ('intentions', 'tasks_created', 'tasks_completed')
+BACKFILL_CHUNK = 10000
+
+def _upsert_statement(dialect):
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(DailyStats)
+
+def record(user_id, day, **deltas):
+    """
+    Adds `deltas` (intentions=1, tasks_completed=-1, ...) to a user's row for `day`,
+    creating the row if needed. Runs in the caller's transaction.
+    """
+    stmt = _upsert_statement(db.engine.dialect.name)
+    if stmt is not None:
+        stmt = stmt.values(user_id=user_id, day=day, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'day'],
+            set_={name: getattr(DailyStats, name) + stmt.excluded[name] for name in deltas},
+        )
+        db.session.execute(stmt)
+        return
+
+    # No native upsert: update, and insert when there was no row yet
+    result = db.session.execute(
+        db.update(DailyStats).where(DailyStats.user_id == user_id, DailyStats.day == day)
+        .values({name: getattr(DailyStats, name) + delta for name, delta in deltas.items()})
+    )
+    if result.rowcount == 0:
+        db.session.execute(db.insert(DailyStats).values(user_id=user_id, day=day, **deltas))
+
+def intention_created(user_id, timestamp):
+    record(user_id, timestamp.date(), intentions=1)
+
+def task_created(task):
+    """
+    Stamps a new task's created_at (and completed_at, if it starts out completed) and counts it.
+    """
+    now = datetime.utcnow()
+    task.created_at = now
+    if task.status == 'completed':
+        task.completed_at = now
+        record(task.user_id, now.date(), tasks_created=1, tasks_completed=1)
+    else:
+        record(task.user_id, now.date(), tasks_created=1)
+
+def task_status_changed(task, old_status):
+    if old_status != 'completed' and task.status == 'completed':
+        task.completed_at = datetime.utcnow()
+        record(task.user_id, task.completed_at.date(), tasks_completed=1)
+    elif old_status == 'completed' and task.status != 'completed':
+        if task.completed_at is not None:
+            record(task.user_id, task.completed_at.date(), tasks_completed=-1)
+        task.completed_at = None
+
+def task_deleted(task):
+    # Rollups describe the tasks that exist, so a backfill reproduces them exactly
+    if task.created_at is not None:
+        record(task.user_id, task.created_at.date(), tasks_created=-1)
+    if task.completed_at is not None:
+        record(task.user_id, task.completed_at.date(), tasks_completed=-1)
+
+def daily(user_id, since, until):
+    """
+    Returns one dict per day from `since` to `until` inclusive, with zeros for days without a row.
+    """
+    rows = db.session.execute(
+        db.select(DailyStats).where(DailyStats.user_id == user_id, DailyStats.day.between(since, until))
+    ).scalars()
+    by_day = {row.day: row for row in rows}
+    days = []
+    day = since
+    while day <= until:
+        row = by_day.get(day)
+        days.append({"day": day.isoformat(), **{name: getattr(row, name) if row else 0 for name in COUNTERS}})
+        day += timedelta(days=1)
+    return days
+
+def streaks(user_id, today):
+    """
+    Returns (current, longest) runs of consecutive days with at least one intention. The
+    current streak still counts when today has no intention yet but yesterday did.
+    """
+    active_days = db.session.execute(
+        db.select(DailyStats.day).where(DailyStats.user_id == user_id, DailyStats.intentions > 0)
+        .order_by(DailyStats.day)
+    ).scalars().all()
+
+    longest = run = 0
+    previous = None
+    for day in active_days:
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+
+    current = run if previous is not None and today - previous <= timedelta(days=1) else 0
+    return current, longest
+
+def _as_date(value):
+    # func.date() returns a string on SQLite and a date on PostgreSQL
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def backfill():
+    """
+    Rebuilds daily_stats from tasks and intentions in one transaction. Returns the row count.
+    """
+    totals = {}
+    sources = [
+        ('intentions', Intention.user_id, Intention.timestamp),
+        ('tasks_created', Task.user_id, Task.created_at),
+        ('tasks_completed', Task.user_id, Task.completed_at),
+    ]
+    for name, user_column, time_column in sources:
+        day = sa.func.date(time_column)
+        query = db.select(user_column, day, sa.func.count()).where(time_column.is_not(None)).group_by(user_column, day)
+        for user_id, value, count in db.session.execute(query):
+            row = totals.setdefault((user_id, _as_date(value)), dict.fromkeys(COUNTERS, 0))
+            row[name] = count
+
+    db.session.execute(db.delete(DailyStats))
+    # Every user's analytics may have changed, so no cached response or ETag may be reused
+    db.session.execute(db.update(User).values(version=User.version + 1))
+    rows = [{"user_id": user_id, "day": day, **counts} for (user_id, day), counts in totals.items()]
+    for start in range(0, len(rows), BACKFILL_CHUNK):
+        db.session.execute(db.insert(DailyStats), rows[start:start + BACKFILL_CHUNK])
+    db.session.commit()
+    return len(rows)
+
+def register_commands(app):
+    stats_cli = AppGroup('stats', help="Manage the daily activity rollups.")
+
+    @stats_cli.command('backfill')
+    def backfill_command():
+        """Rebuild daily_stats from the tasks and intentions tables."""
+        count = backfill()
+        click.echo(f"Rebuilt {count} daily_stats rows.")
+
+    app.cli.add_command(stats_cli)
@@ -0,0 +1,92 @@
+"""
+Incremental sync: what changed in a user's tasks and intentions since a cursor.
+
+The cursor is the user's version (users.version). Every write bumps it and stamps the new value
+on the rows it creates or changes (their `seq` column) and on a tombstone for each row it
+deletes. So "everything after cursor n" is an index range scan on (user_id, seq) in tasks,
+intentions and tombstones.
+
+Tombstones older than TOMBSTONE_RETENTION_DAYS (30) are pruned by a daily job. A user's
+sync_floor then records the newest pruned seq, and a client whose cursor is older is told to
+reload everything instead of silently missing deletions.
+"""
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+
+from models import db, Intention, Task, Tombstone, User
+from serializers import INTENTION, TASK
+
+TOMBSTONE_RETENTION = timedelta(days=int(os.getenv('TOMBSTONE_RETENTION_DAYS', '30')))
+# Past this many changes a reload is cheaper than the diff
+MAX_CHANGES = 1000
+
+def record_deletion(user_id, kind, object_id, seq):
+    """
+    Leaves a tombstone for a deleted row. Runs in the caller's transaction.
+    """
+    db.session.add(Tombstone(user_id=user_id, kind=kind, object_id=object_id, seq=seq,
+                             deleted_at=datetime.utcnow()))
+
+def changes(user_id, since, version):
+    """
+    Returns the tasks and intentions changed after `since` up to `version`, and the ids
+    deleted in that range by kind, or None when there are more than MAX_CHANGES of any.
+    """
+    tasks = db.session.execute(
+        TASK.select().where(Task.user_id == user_id, Task.seq > since, Task.seq <= version)
+        .order_by(Task.seq, Task.id).limit(MAX_CHANGES + 1)
+    ).all()
+    intentions = db.session.execute(
+        INTENTION.select().where(Intention.user_id == user_id, Intention.seq > since, Intention.seq <= version)
+        .order_by(Intention.seq, Intention.id).limit(MAX_CHANGES + 1)
+    ).all()
+    tombstones = db.session.execute(
+        db.select(Tombstone.kind, Tombstone.object_id)
+        .where(Tombstone.user_id == user_id, Tombstone.seq > since, Tombstone.seq <= version)
+        .order_by(Tombstone.seq, Tombstone.id).limit(MAX_CHANGES + 1)
+    ).all()
+    if max(len(tasks), len(intentions), len(tombstones)) > MAX_CHANGES:
+        return None
+
+    deleted = {'tasks': [], 'intentions': []}
+    for kind, object_id in tombstones:
+        deleted[kind + 's'].append(object_id)
+    return {
+        "tasks": [TASK.dump(row) for row in tasks],
+        "intentions": [INTENTION.dump(row) for row in intentions],
+        "deleted": deleted,
+    }
+
+def prune_tombstones(older_than):
+    """
+    Deletes tombstones recorded before `older_than` and raises each affected user's
+    sync_floor past them. Returns the number of tombstones deleted.
+    """
+    pruned = db.session.execute(
+        db.select(Tombstone.user_id, db.func.max(Tombstone.seq))
+        .where(Tombstone.deleted_at < older_than).group_by(Tombstone.user_id)
+    ).all()
+    for user_id, seq in pruned:
+        # Bumping the version as well keeps cached sync responses from outliving the floor
+        db.session.execute(
+            db.update(User).where(User.id == user_id).values(sync_floor=seq, version=User.version + 1)
+        )
+    result = db.session.execute(db.delete(Tombstone).where(Tombstone.deleted_at < older_than))
+    db.session.commit()
+    return result.rowcount
+
+def register_commands(app):
+    sync_cli = AppGroup('sync', help="Maintain incremental sync data.")
+
+    @sync_cli.command('prune')
+    @click.option('--days', type=int, default=TOMBSTONE_RETENTION.days, show_default=True,
+                  help="Keep tombstones from the last this many days.")
+    def prune_command(days):
+        """Delete old tombstones (a daily background job does this too)."""
+        pruned = prune_tombstones(datetime.utcnow() - timedelta(days=days))
+        click.echo(f"Pruned {pruned} tombstones.")
+
+    app.cli.add_command(sync_cli)
@@ -0,0 +1,37 @@
+"""
+Runs background jobs from the jobs table (see jobs.py):
+
+    python worker.py
+
+Start as many worker processes as needed; each job is leased to one worker at a time.
+
+    JOB_WORKER_CONCURRENCY   jobs run at once in this process (default 4)
+    JOB_POLL_SECONDS         how long an idle worker thread waits before looking again (default 1)
+    JOB_METRICS_PORT         serve this process's Prometheus metrics on that port
+                             (with PROMETHEUS_MULTIPROC_DIR set, the web app's /metrics has them too)
+
+Apply migrations (flask db upgrade) before starting workers. SIGTERM finishes the running jobs
+and exits.
+"""
+import os
+import signal
+
+from app import create_app, startup
+import jobs
+
+if __name__ == '__main__':
+    app = create_app({'AUTO_MIGRATE': False})
+    startup(app)
+    worker = jobs.Worker(
+        app,
+        concurrency=int(os.getenv('JOB_WORKER_CONCURRENCY', '4')),
+        poll_seconds=float(os.getenv('JOB_POLL_SECONDS', '1')),
+    )
+    if os.getenv('JOB_METRICS_PORT'):
+        from prometheus_client import start_http_server
+        start_http_server(int(os.getenv('JOB_METRICS_PORT')))
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    app.logger.info(f"Job worker {worker.name} started with {worker.concurrency} threads")
+    worker.run()
@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Migrations are applied once by the gunicorn master (gunicorn.conf.py), not by each worker.
+With SCHEMA_CHECK=1 a worker refuses to start if any are missing.
+"""
+from app import create_app, startup
+
+app = create_app({'AUTO_MIGRATE': False})
+startup(app)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Methods that are safe to send twice. POST is only retried when the caller asks for it,
+# otherwise a timeout after the backend committed would create a duplicate row.
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE'}
+RETRY_STATUSES = {502, 503, 504}
+# A rate-limited request is retried after its Retry-After, unless that is longer than this
+MAX_RETRY_AFTER = 30
+
+
+class BackendError(Exception):
+    """
+    Raised when the backend cannot be reached or answers with an error status.
+    `status` is None for connection errors and timeouts.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    @property
+    def is_connection_error(self):
+        return self.status is None
+
+
+class BackendClient:
+    """
+    A single pooled HTTP client for the Nosy Canary backend.
+
+    One aiohttp session (and so one keep-alive connection pool) is shared by every
+    command. Call start() once the event loop is running and close() on shutdown.
+    """
+
+    def __init__(self, base_url, limit=100, limit_per_host=10, timeout=10.0,
+                 max_retries=2, backoff=0.5, etag_cache_size=1000):
+        self.base_url = base_url.rstrip('/')
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.etag_cache_size = etag_cache_size
+        # (path, params) -> (etag, body) of the last response to a conditional GET
+        self._etags = OrderedDict()
+        self._session = None
+
+    async def start(self):
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            raise_for_status=False,
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method, path, *, json=None, params=None, expected=(200,), retry=None,
+                      conditional=False, timeout=None):
+        """
+        Sends a request and returns the decoded JSON body for an expected status.
+        Raises BackendError with the backend's 'error' message otherwise.
+
+        `timeout` (seconds) overrides the client's timeout for each attempt of this request.
+
+        A 429 is retried after the backend's Retry-After whatever the method, since the
+        backend didn't act on the request.
+
+        With conditional=True (GET only) the last body is kept with its ETag and sent back as
+        If-None-Match, so an unchanged resource comes back as an empty 304.
+
+        A DELETE that gets a 404 after an attempt that may have reached the backend (a
+        timeout, a dropped connection or a 5xx) is taken as done: that attempt deleted it.
+        """
+        if self._session is None:
+            raise RuntimeError("BackendClient.start() has not been called")
+
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        attempts = 1 + self.max_retries
+        url = f"{self.base_url}{path}"
+
+        # Left out entirely otherwise: aiohttp reads timeout=None as "no timeout at all"
+        options = {'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {}
+        headers = {}
+        cache_key = (path, tuple(sorted((params or {}).items())))
+        cached = self._etags.get(cache_key) if conditional else None
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]
+
+        # Whether an earlier attempt may have been applied even though we never saw it succeed
+        maybe_applied = False
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            delay = self.backoff * (2 ** attempt)
+            try:
+                async with self._session.request(method, url, json=json, params=params, headers=headers,
+                                                 **options) as resp:
+                    retry_after = _retry_after(resp) if resp.status == 429 else None
+                    if retry_after is not None and retry_after <= MAX_RETRY_AFTER and not last_attempt:
+                        logger.warning("%s %s was rate limited, retrying in %ss", method, path, retry_after)
+                        delay = retry_after
+                    elif resp.status in RETRY_STATUSES and retry and not last_attempt:
+                        logger.warning("%s %s returned %s, retrying", method, path, resp.status)
+                        maybe_applied = True
+                    elif resp.status == 404 and method == 'DELETE' and maybe_applied:
+                        logger.info("%s %s returned 404 on a retry, the earlier attempt deleted it", method, path)
+                        return {}
+                    elif resp.status == 304 and cached is not None:
+                        self._etags.move_to_end(cache_key)
+                        return cached[1]
+                    elif resp.status in expected:
+                        body = await resp.json()
+                        if conditional and resp.headers.get('ETag'):
+                            self._remember(cache_key, resp.headers['ETag'], body)
+                        return body
+                    else:
+                        raise BackendError(await _error_message(resp), status=resp.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if last_attempt or not retry:
+                    raise BackendError(str(e) or e.__class__.__name__) from e
+                logger.warning("%s %s failed (%s), retrying", method, path, e)
+                maybe_applied = True
+
+            await asyncio.sleep(delay)
+
+    def _remember(self, cache_key, etag, body):
+        self._etags[cache_key] = (etag, body)
+        self._etags.move_to_end(cache_key)
+        while len(self._etags) > self.etag_cache_size:
+            self._etags.popitem(last=False)
+
+    def stream(self, path, *, params=None, headers=None, read_timeout=60):
+        """
+        Opens a long-lived GET (e.g. Server-Sent Events) and returns the response context manager.
+        It has no total timeout; `read_timeout` bounds the silence between chunks instead.
+        """
+        if self._session is None:
+            raise RuntimeError("BackendClient.start() has not been called")
+        return self._session.get(
+            f"{self.base_url}{path}", params=params, headers=headers,
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=read_timeout),
+        )
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        kwargs.setdefault('expected', (200, 201))
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
+
+
+def _retry_after(resp):
+    try:
+        return max(0, int(resp.headers.get('Retry-After', '')))
+    except ValueError:
+        return None
+
+
+async def _error_message(resp):
+    try:
+        error_data = await resp.json()
+        return error_data.get('error', 'Unknown error')
+    except Exception:
+        return 'Unknown error'
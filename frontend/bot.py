@@ -2,11 +2,18 @@ import discord
 from discord.ext import commands
 from discord import app_commands, Embed
 import os
-from dotenv import load_dotenv
-import aiohttp
 import asyncio
+import functools
+import logging
+from dotenv import load_dotenv
 from datetime import datetime
 
+from backend_client import BackendClient, BackendError
+from event_stream import EventStream
+from command_sync import sync_commands
+from metrics import CommandMetrics, ShardMetrics, seconds_since
+from user_cache import UserStateCache
+
 load_dotenv()
 
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -14,97 +21,401 @@ if TOKEN is None:
     raise ValueError("DISCORD_TOKEN is not set. Check your .env file or environment variables.")
 
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5000")
-GUILD_ID = os.getenv("GUILD_ID")
 
-if GUILD_ID is None:
-    raise ValueError("GUILD_ID is not set. Please add it to your .env file.")
+def int_list(name, default=""):
+    try:
+        return [int(part) for part in os.getenv(name, default).split(",") if part.strip()]
+    except ValueError:
+        raise ValueError(f"{name} must be a comma-separated list of integers.")
+
+# Guilds to sync slash commands to, where they show up instantly. Without any the commands
+# are synced globally, which reaches every guild but can take up to an hour.
+GUILD_IDS = int_list("GUILD_IDS", os.getenv("GUILD_ID", ""))
 
-try:
-    GUILD_ID = int(GUILD_ID)
-except ValueError:
-    raise ValueError("GUILD_ID must be an integer.")
+# Shards across all bot processes. Unset, a single process runs as many as Discord recommends.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+# The shards this process runs, for splitting the gateway load over several processes
+SHARD_IDS = int_list("SHARD_IDS") or None
+
+if SHARD_IDS is not None:
+    if SHARD_COUNT is None:
+        raise ValueError("SHARD_IDS needs SHARD_COUNT, the number of shards across every process.")
+    if not all(0 <= shard_id < SHARD_COUNT for shard_id in SHARD_IDS):
+        raise ValueError(f"SHARD_IDS must be between 0 and SHARD_COUNT - 1 ({SHARD_COUNT - 1}).")
+
+API_POOL_LIMIT_PER_HOST = int(os.getenv("API_POOL_LIMIT_PER_HOST", "10"))
+API_TIMEOUT_SECONDS = float(os.getenv("API_TIMEOUT_SECONDS", "10"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "2"))
+# Every process follows the event stream, so each needs a cursor file of its own
+EVENT_CURSOR_FILE = os.getenv("EVENT_CURSOR_FILE", ".event_cursor" + "".join(f"-{shard_id}" for shard_id in SHARD_IDS or ()))
+COMMAND_SYNC_HASH_FILE = os.getenv("COMMAND_SYNC_HASH_FILE", ".command_sync_hash")
+# How many prompt DMs are sent at once while working through a batch of events
+PROMPT_SEND_CONCURRENCY = int(os.getenv("PROMPT_SEND_CONCURRENCY", "5"))
+# Upper bound on a command's backend work, retries included, before the user is told to try again
+COMMAND_TIMEOUT_SECONDS = float(os.getenv("COMMAND_TIMEOUT_SECONDS", "20"))
+COMMAND_METRICS_LOG_SECONDS = int(os.getenv("COMMAND_METRICS_LOG_SECONDS", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+
+logger = logging.getLogger("nosy_canary.bot")
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+class CanaryBot(commands.AutoShardedBot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # One pooled client shared by every command, opened in setup_hook once the loop is running
+        self.backend = BackendClient(
+            API_BASE_URL,
+            limit_per_host=API_POOL_LIMIT_PER_HOST,
+            timeout=API_TIMEOUT_SECONDS,
+            max_retries=API_MAX_RETRIES,
+        )
+
+        self.events = EventStream(self.backend, self.handle_events, EVENT_CURSOR_FILE)
+        self._prompt_slots = asyncio.Semaphore(PROMPT_SEND_CONCURRENCY)
+        self.command_metrics = CommandMetrics()
+        self.shard_metrics = ShardMetrics(window=COMMAND_METRICS_LOG_SECONDS)
+        self.user_cache = UserStateCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+        self._metrics_task = None
+        self.add_listener(self.count_message, "on_message")
+        self.add_listener(self.count_interaction, "on_interaction")
+
+    async def setup_hook(self):
+        await self.backend.start()
+        # Prompts and task changes are pushed by the backend instead of polled per user
+        self.events.start()
+        self._metrics_task = asyncio.create_task(self.log_metrics(), name="metrics")
+        # Only one process registers the commands
+        if SHARD_IDS is None or 0 in SHARD_IDS:
+            await sync_commands(self.tree, GUILD_IDS, COMMAND_SYNC_HASH_FILE)
+
+    async def close(self):
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+        await self.events.stop()
+        await super().close()
+        await self.backend.close()
+
+    async def log_metrics(self):
+        while True:
+            await asyncio.sleep(COMMAND_METRICS_LOG_SECONDS)
+            for command, numbers in sorted(self.command_metrics.summary().items()):
+                logger.info("/%s %s", command, numbers)
+            logger.info("User cache %s", self.user_cache.stats())
+            for shard_id, numbers in sorted(self.shard_metrics.summary(self.latencies).items()):
+                logger.info("Shard %s %s", shard_id, numbers)
+
+    def shard_for(self, guild_id):
+        # Discord's mapping of guilds to shards; DMs arrive on shard 0
+        return (guild_id >> 22) % self.shard_count if guild_id else 0
+
+    async def count_message(self, message):
+        self.shard_metrics.observe_event(self.shard_for(message.guild.id if message.guild else None))
+
+    async def count_interaction(self, interaction):
+        self.shard_metrics.observe_event(self.shard_for(interaction.guild_id))
+
+    async def on_shard_disconnect(self, shard_id):
+        self.shard_metrics.observe_disconnect(shard_id)
+        logger.warning("Shard %s disconnected", shard_id)
+
+    def owns_user(self, discord_id):
+        """
+        With the shards split over several processes every process sees every event, so a
+        prompt is only sent by the process running the shard the user's id maps to.
+        """
+        if SHARD_IDS is None:
+            return True
+        return (int(discord_id) >> 22) % SHARD_COUNT in SHARD_IDS
+
+    async def handle_events(self, events):
+        for event in events:
+            if event['kind'] == 'task':
+                self.user_cache.apply_task_event(event['discord_id'], event['payload'])
+        prompts = [event for event in events if event['kind'] == 'prompt' and self.owns_user(event['discord_id'])]
+        await asyncio.gather(*(self.send_prompt(event['discord_id']) for event in prompts))
+
+    async def send_prompt(self, discord_id):
+        async with self._prompt_slots:
+            try:
+                await self.wait_until_ready()
+                user = self.get_user(int(discord_id)) or await self.fetch_user(int(discord_id))
+                embed = make_embed(
+                    "🐤 Time to wind down",
+                    "What's your intention for tomorrow? Take a look at `/tasks` before bed."
+                )
+                await user.send(embed=embed)
+            except discord.HTTPException as e:
+                # Users with closed DMs or who left every shared guild can't be reached
+                logger.warning("Could not send prompt to %s: %s", discord_id, e)
+
+bot = CanaryBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+
+def make_embed(title, description=None, color=0x00ff00):
+    embed = Embed(title=title, description=description, color=color)
+    embed.set_footer(text="Nosy Canary Bot")
+    embed.timestamp = datetime.utcnow()
+    return embed
+
+def error_embed(title, error):
+    # Connection problems get their own title so users can tell "backend down" from "bad input"
+    if error.is_connection_error:
+        return make_embed("Connection Error", f"❌ Failed to connect to the backend API: {error}", color=0xff0000)
+    return make_embed(title, error.message, color=0xff0000)
+
+def deferred(func):
+    """
+    Acknowledges a slash command before running it, so a slow backend can't push the reply past
+    Discord's 3-second deadline. The command then answers with interaction.followup.send (the
+    reply stays ephemeral) and gets COMMAND_TIMEOUT_SECONDS to do so. Response times are recorded
+    in bot.command_metrics.
+    """
+    @functools.wraps(func)
+    async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+        name = interaction.command.name if interaction.command else func.__name__
+        try:
+            await interaction.response.defer(ephemeral=True, thinking=True)
+        except discord.NotFound:
+            # The interaction expired before we could acknowledge it
+            bot.command_metrics.observe(name, seconds_since(interaction.created_at), None, ok=False)
+            raise
+        ack_seconds = seconds_since(interaction.created_at)
+
+        ok = True
+        try:
+            await asyncio.wait_for(func(interaction, *args, **kwargs), timeout=COMMAND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            ok = False
+            await interaction.followup.send(embed=make_embed(
+                "Timed Out", "The backend took too long to answer. Please try again in a moment.", color=0xff0000
+            ), ephemeral=True)
+        except Exception:
+            ok = False
+            await interaction.followup.send(embed=make_embed(
+                "Something Went Wrong", "The command failed unexpectedly.", color=0xff0000
+            ), ephemeral=True)
+            raise
+        finally:
+            bot.command_metrics.observe(name, ack_seconds, seconds_since(interaction.created_at), ok=ok)
+    return wrapper
 
 @bot.event
 async def on_ready():
-    print(f"Logged in as {bot.user}")
-    try:
-        guild = discord.Object(id=GUILD_ID)
-        synced = await bot.tree.sync(guild=guild)
-        print(f"Synced {len(synced)} commands to guild ID {GUILD_ID}")
-    except Exception as e:
-        print(f"Error syncing commands: {e}")
+    # Commands are synced once in setup_hook; on_ready fires again after every reconnect
+    print(f"Logged in as {bot.user} with shards {sorted(bot.shards)} of {bot.shard_count}")
+
+TASKS_PAGE_SIZE = 10
 
 @bot.tree.command(name="start", description="Initialize your user session or check user status")
+@deferred
 async def start(interaction: discord.Interaction):
-    # Placeholder response, could be improved to fetch user data from the backend.
-    await interaction.response.send_message("Your session is ready!", ephemeral=True)
+    discord_id = str(interaction.user.id)
+    # The three reads don't depend on each other, so they wait on the backend together
+    user, tasks_page, timer = await asyncio.gather(
+        fetch_profile(discord_id),
+        fetch_tasks_page(discord_id),
+        bot.backend.get(f"/api/timer/{discord_id}"),
+        return_exceptions=True,
+    )
+
+    if isinstance(user, BackendError) and user.status == 404:
+        # First time here: create the user, who has no tasks or prompts yet
+        try:
+            user = await bot.backend.post("/api/user", json={"discord_id": discord_id}, retry=True)
+        except BackendError as e:
+            await interaction.followup.send(embed=error_embed("Failed to Start", e), ephemeral=True)
+            return
+        bot.user_cache.set_profile(discord_id, user)
+        bot.user_cache.set_tasks(discord_id, [])
+        tasks_page, timer = {"tasks": [], "next_cursor": None}, {"next_prompt_at": None}
+        title = "Welcome to Nosy Canary!"
+    else:
+        for result in (user, tasks_page, timer):
+            if isinstance(result, BackendError):
+                await interaction.followup.send(embed=error_embed("Failed to Load Your Status", result), ephemeral=True)
+                return
+            if isinstance(result, BaseException):
+                raise result
+        title = "Your Nosy Canary Status"
+
+    task_count = len(tasks_page.get('tasks', []))
+    embed = make_embed(title)
+    embed.add_field(name="Bedtime (UTC)", value=user.get('canary_bedtime') or "Not set, use `/setup`", inline=True)
+    embed.add_field(name="Tasks", value=f"{task_count}+" if tasks_page.get('next_cursor') else str(task_count), inline=True)
+    if timer.get('next_prompt_at'):
+        embed.add_field(name="Next Prompt", value=f"in {timer['next_prompt_in_seconds'] // 60} minutes", inline=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="setup", description="Set your canary bedtime or preferences")
-async def setup_command(interaction: discord.Interaction):
-    # Placeholder response, later can be replaced with user configuration logic.
-    await interaction.response.send_message("Setup command received. You can configure your bedtime here.", ephemeral=True)
+@app_commands.describe(bedtime="Your bedtime as HH:MM in UTC, e.g. 22:30")
+@deferred
+async def setup_command(interaction: discord.Interaction, bedtime: str):
+    discord_id = str(interaction.user.id)
+    payload = {
+        "discord_id": discord_id,
+        "canary_bedtime": bedtime
+    }
+
+    try:
+        # Saving a bedtime is an upsert, so a retried POST can't create anything twice
+        user = await bot.backend.post("/api/user", json=payload, retry=True)
+    except BackendError as e:
+        await interaction.followup.send(embed=error_embed("Failed to Save Bedtime", e), ephemeral=True)
+        return
+    bot.user_cache.set_profile(discord_id, user)
+
+    embed = make_embed("Bedtime Saved", f"You'll get your evening prompt at **{bedtime} UTC** every day.")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+def truncate(text, limit):
+    text = text or ''
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+# Task lists up to the backend's largest page are cached whole; longer ones are paged from the backend
+TASK_CACHE_LIMIT = 200
+
+async def fetch_profile(discord_id):
+    profile = bot.user_cache.get_profile(discord_id)
+    if profile is None:
+        profile = await bot.backend.get(f"/api/user/{discord_id}", conditional=True)
+        bot.user_cache.set_profile(discord_id, profile)
+    return profile
+
+async def fetch_tasks_page(discord_id, after_id=None):
+    tasks = bot.user_cache.get_tasks(discord_id)
+    if tasks is None and not bot.user_cache.has_long_task_list(discord_id):
+        # Conditional: once the cached list expires, an unchanged one comes back as an empty 304
+        data = await bot.backend.get(f"/api/tasks/{discord_id}", params={"limit": TASK_CACHE_LIMIT}, conditional=True)
+        if data.get('next_cursor') is None:
+            tasks = data.get('tasks', [])
+            bot.user_cache.set_tasks(discord_id, tasks)
+        else:
+            # Too long to cache: skip this fetch for the user from now on, but use it for page one
+            bot.user_cache.mark_long_task_list(discord_id)
+            if after_id is None:
+                page = data['tasks'][:TASKS_PAGE_SIZE]
+                return {"tasks": page, "next_cursor": page[-1]['id']}
+
+    if tasks is None:
+        params = {"limit": TASKS_PAGE_SIZE}
+        if after_id is not None:
+            params["after_id"] = after_id
+        return await bot.backend.get(f"/api/tasks/{discord_id}", params=params, conditional=True)
+
+    remaining = [task for task in tasks if after_id is None or task['id'] > after_id]
+    page = remaining[:TASKS_PAGE_SIZE]
+    return {"tasks": page, "next_cursor": page[-1]['id'] if len(remaining) > TASKS_PAGE_SIZE else None}
+
+def tasks_embed(tasks_data, page):
+    if not tasks_data:
+        # Create a red embed if no tasks are found
+        return make_embed("Your Tasks", "No tasks found.", color=0xff0000)
+
+    # Create a green embed for tasks
+    embed = make_embed("Your Tasks", f"Here are your current tasks (page {page + 1}):")
+    # Add a field for each task; Discord caps a field value at 1024 characters
+    for task in tasks_data:
+        embed.add_field(
+            name=f"Task ID: {task['id']}",
+            value=truncate(f"**Description:** {task['description']}\n**Status:** {task['status']}\n**Notes:** {task['notes']}", 1024),
+            inline=False
+        )
+    return embed
+
+class TaskPager(discord.ui.View):
+    """
+    Previous/Next buttons for /tasks. Pages are fetched from the backend one at a time
+    with keyset cursors, remembering the cursor of every page already seen.
+    """
+
+    def __init__(self, discord_id, first_page):
+        super().__init__(timeout=300)
+        self.discord_id = discord_id
+        self.cursors = [None]  # after_id that fetches each page seen so far
+        self.page = 0
+        self.next_cursor = first_page.get('next_cursor')
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.next_cursor is None
+
+    async def show(self, interaction, page):
+        # Acknowledge the click first; the page is swapped in once the backend answers
+        await interaction.response.defer()
+        try:
+            data = await fetch_tasks_page(self.discord_id, self.cursors[page])
+        except BackendError as e:
+            await interaction.followup.send(embed=error_embed("Error Fetching Tasks", e), ephemeral=True)
+            return
+
+        self.page = page
+        self.next_cursor = data.get('next_cursor')
+        self.update_buttons()
+        await interaction.edit_original_response(embed=tasks_embed(data.get('tasks', []), page), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.page + 1 == len(self.cursors):
+            self.cursors.append(self.next_cursor)
+        await self.show(interaction, self.page + 1)
 
 @bot.tree.command(name="tasks", description="List your current tasks")
+@deferred
 async def tasks(interaction: discord.Interaction):
     discord_id = str(interaction.user.id)
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(f"{API_BASE_URL}/api/tasks/{discord_id}") as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    tasks_data = data.get('tasks', [])
-
-                    if tasks_data:
-                        # Create a green embed for tasks
-                        embed = Embed(
-                            title="Your Tasks",
-                            description="Here are your current tasks:",
-                            color=0x00ff00  # Green
-                        )
-                        # Add a field for each task
-                        for task in tasks_data:
-                            embed.add_field(
-                                name=f"Task ID: {task['id']}",
-                                value=f"**Description:** {task['description']}\n**Status:** {task['status']}\n**Notes:** {task['notes']}",
-                                inline=False
-                            )
-                    else:
-                        # Create a red embed if no tasks are found
-                        embed = Embed(
-                            title="Your Tasks",
-                            description="No tasks found.",
-                            color=0xff0000  # Red
-                        )
-
-                    # Add a footer and timestamp for a more polished look
-                    embed.set_footer(text="Nosy Canary Bot")
-                    embed.timestamp = datetime.utcnow()
-
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-                else:
-                    try:
-                        error_data = await resp.json()
-                        error_message = error_data.get('error', 'Unknown error')
-                    except Exception:
-                        error_message = 'Unknown error'
-
-                    await interaction.response.send_message(
-                        f"Error fetching tasks: {error_message}",
-                        ephemeral=True
-                    )
-        except aiohttp.ClientError as e:
-            await interaction.response.send_message(
-                f"Failed to connect to the backend API: {e}",
-                ephemeral=True
-            )
+    try:
+        data = await fetch_tasks_page(discord_id)
+    except BackendError as e:
+        await interaction.followup.send(embed=error_embed("Error Fetching Tasks", e), ephemeral=True)
+        return
+
+    tasks_data = data.get('tasks', [])
+    embed = tasks_embed(tasks_data, 0)
+    if data.get('next_cursor') is None:
+        # Everything fits on one page, no buttons needed
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.followup.send(embed=embed, view=TaskPager(discord_id, data), ephemeral=True)
+
+SEARCH_PAGE_SIZE = 10
+
+@bot.tree.command(name="search", description="Search your tasks, notes and intentions")
+@app_commands.describe(query="Words to look for")
+@deferred
+async def search(interaction: discord.Interaction, query: str):
+    discord_id = str(interaction.user.id)
+    params = {"q": query, "limit": SEARCH_PAGE_SIZE}
+    try:
+        data = await bot.backend.get(f"/api/search/{discord_id}", params=params, conditional=True)
+    except BackendError as e:
+        await interaction.followup.send(embed=error_embed("Search Failed", e), ephemeral=True)
+        return
+
+    results = data.get('results', [])
+    if not results:
+        embed = make_embed("Search Results", f"Nothing matches **{truncate(query, 200)}**.", color=0xff0000)
+    else:
+        embed = make_embed("Search Results", f"Best matches for **{truncate(query, 200)}**:")
+        for hit in results:
+            if hit['kind'] == 'task':
+                name = f"Task ID: {hit['id']} ({hit.get('status')})"
+            else:
+                name = f"Intention ({(hit.get('timestamp') or '')[:10]})"
+            embed.add_field(name=name, value=truncate(hit['snippet'] or hit['text'], 1024), inline=False)
+        if data.get('next_offset') is not None:
+            embed.description += f"\nShowing the first {len(results)}; add more words to narrow it down."
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="addtask", description="Add a new task with a description")
 @app_commands.describe(description="The description of the task to add")
+@deferred
 async def addtask(interaction: discord.Interaction, description: str):
     discord_id = str(interaction.user.id)
     payload = {
@@ -112,143 +423,57 @@ async def addtask(interaction: discord.Interaction, description: str):
         "description": description
     }
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(f"{API_BASE_URL}/api/tasks", json=payload) as resp:
-                if resp.status == 201:
-                    data = await resp.json()
-                    task_id = data.get('task_id', 'N/A')
-                    
-                    embed = Embed(
-                        title="Task Added Successfully!",
-                        color=0x00ff00  # Green
-                    )
-                    embed.add_field(name="Task ID", value=str(task_id), inline=True)
-                    embed.add_field(name="Description", value=description, inline=False)
-                    embed.set_footer(text="Nosy Canary Bot")
-                    embed.timestamp = datetime.utcnow()
-                    
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-                else:
-                    try:
-                        error_data = await resp.json()
-                        error_message = error_data.get('error', 'Unknown error')
-                    except Exception:
-                        error_message = 'Unknown error'
-                    
-                    embed = Embed(
-                        title="Failed to Add Task",
-                        description=error_message,
-                        color=0xff0000  # Red
-                    )
-                    embed.set_footer(text="Nosy Canary Bot")
-                    embed.timestamp = datetime.utcnow()
-                    
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-        except aiohttp.ClientError as e:
-            embed = Embed(
-                title="Connection Error",
-                description=f"❌ Failed to connect to the backend API: {e}",
-                color=0xff0000  # Red
-            )
-            embed.set_footer(text="Nosy Canary Bot")
-            embed.timestamp = datetime.utcnow()
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+    try:
+        data = await bot.backend.post("/api/tasks", json=payload, expected=(201,))
+    except BackendError as e:
+        await interaction.followup.send(embed=error_embed("Failed to Add Task", e), ephemeral=True)
+        return
+
+    bot.user_cache.task_added(discord_id, {"id": data['task_id'], "description": description, "status": "pending", "notes": ""})
+
+    embed = make_embed("Task Added Successfully!")
+    embed.add_field(name="Task ID", value=str(data.get('task_id', 'N/A')), inline=True)
+    embed.add_field(name="Description", value=description, inline=False)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="edittask", description="Edit the description of an existing task")
 @app_commands.describe(
     task_id="The ID of the task to edit",
     new_description="The new description for the task"
 )
+@deferred
 async def edittask(interaction: discord.Interaction, task_id: int, new_description: str):
     payload = {
         "description": new_description
     }
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.put(f"{API_BASE_URL}/api/tasks/{task_id}", json=payload) as resp:
-                if resp.status == 200:
-                    embed = Embed(
-                        title="Task Updated Successfully!",
-                        color=0x00ff00  # Green
-                    )
-                    embed.add_field(name="Task ID", value=str(task_id), inline=True)
-                    embed.add_field(name="New Description", value=new_description, inline=False)
-                    embed.set_footer(text="Nosy Canary Bot")
-                    embed.timestamp = datetime.utcnow()
-                    
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-                else:
-                    try:
-                        error_data = await resp.json()
-                        error_message = error_data.get('error', 'Unknown error')
-                    except Exception:
-                        error_message = 'Unknown error'
-                    
-                    embed = Embed(
-                        title="Failed to Update Task",
-                        description=error_message,
-                        color=0xff0000  # Red
-                    )
-                    embed.set_footer(text="Nosy Canary Bot")
-                    embed.timestamp = datetime.utcnow()
-                    
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-        except aiohttp.ClientError as e:
-            embed = Embed(
-                title="Connection Error",
-                description=f"❌ Failed to connect to the backend API: {e}",
-                color=0xff0000  # Red
-            )
-            embed.set_footer(text="Nosy Canary Bot")
-            embed.timestamp = datetime.utcnow()
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+    try:
+        await bot.backend.put(f"/api/tasks/{task_id}", json=payload)
+    except BackendError as e:
+        await interaction.followup.send(embed=error_embed("Failed to Update Task", e), ephemeral=True)
+        return
+    bot.user_cache.task_updated(str(interaction.user.id), task_id, payload)
+
+    embed = make_embed("Task Updated Successfully!")
+    embed.add_field(name="Task ID", value=str(task_id), inline=True)
+    embed.add_field(name="New Description", value=new_description, inline=False)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="deletetask", description="Delete a specified task by ID")
 @app_commands.describe(task_id="The ID of the task to delete")
+@deferred
 async def deletetask(interaction: discord.Interaction, task_id: int):
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.delete(f"{API_BASE_URL}/api/tasks/{task_id}") as resp:
-                if resp.status == 200:
-                    embed = Embed(
-                        title="Task Deleted Successfully!",
-                        color=0x00ff00  # Green
-                    )
-                    embed.add_field(name="Task ID", value=str(task_id), inline=True)
-                    embed.set_footer(text="Nosy Canary Bot")
-                    embed.timestamp = datetime.utcnow()
-                    
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-                else:
-                    try:
-                        error_data = await resp.json()
-                        error_message = error_data.get('error', 'Unknown error')
-                    except Exception:
-                        error_message = 'Unknown error'
-                    
-                    embed = Embed(
-                        title="Failed to Delete Task",
-                        description=error_message,
-                        color=0xff0000  # Red
-                    )
-                    embed.set_footer(text="Nosy Canary Bot")
-                    embed.timestamp = datetime.utcnow()
-                    
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-        except aiohttp.ClientError as e:
-            embed = Embed(
-                title="Connection Error",
-                description=f"❌ Failed to connect to the backend API: {e}",
-                color=0xff0000  # Red
-            )
-            embed.set_footer(text="Nosy Canary Bot")
-            embed.timestamp = datetime.utcnow()
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-
-bot.run(TOKEN)
+    try:
+        await bot.backend.delete(f"/api/tasks/{task_id}")
+    except BackendError as e:
+        await interaction.followup.send(embed=error_embed("Failed to Delete Task", e), ephemeral=True)
+        return
+    bot.user_cache.task_deleted(str(interaction.user.id), task_id)
+
+    embed = make_embed("Task Deleted Successfully!")
+    embed.add_field(name="Task ID", value=str(task_id), inline=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+# root_logger: INFO records from this module (such as command metrics) reach the console too
+bot.run(TOKEN, root_logger=True)
 
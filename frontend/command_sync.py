@@ -0,0 +1,63 @@
+import hashlib
+import json
+import logging
+import os
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def tree_hash(tree, guild=None):
+    """
+    A digest of the command payloads `tree` would sync to `guild` (None for global commands).
+    It changes whenever a command, option or description does.
+    """
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands(guild=guild)), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_commands(tree, guild_ids, hash_path):
+    """
+    Syncs the slash commands to each guild in `guild_ids`, or globally when it is empty.
+
+    Discord rate-limits syncing, and a restart rarely changes the commands, so the hash of what
+    was last synced to each target is kept in `hash_path` and targets whose hash is unchanged are
+    skipped. Delete that file to force a sync. Returns the targets that were synced.
+    """
+    hashes = _load(hash_path)
+    synced = []
+    for guild in [discord.Object(id=guild_id) for guild_id in guild_ids] or [None]:
+        target = "global" if guild is None else str(guild.id)
+        if guild is not None:
+            # Guild commands show up instantly; global ones can take up to an hour
+            tree.copy_global_to(guild=guild)
+        digest = tree_hash(tree, guild)
+        if hashes.get(target) == digest:
+            logger.info("Commands for %s are unchanged, skipping sync", target)
+            continue
+        try:
+            commands = await tree.sync(guild=guild)
+        except discord.HTTPException as e:
+            logger.error("Could not sync commands to %s: %s", target, e)
+            continue
+        logger.info("Synced %d commands to %s", len(commands), target)
+        hashes[target] = digest
+        _save(hash_path, hashes)
+        synced.append(target)
+    return synced
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(path, hashes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(hashes, f)
+    os.replace(tmp, path)
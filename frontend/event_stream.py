@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import os
+
+import aiohttp
+
+from backend_client import BackendError
+
+logger = logging.getLogger(__name__)
+
+
+class EventStream:
+    """
+    Consumes the backend's Server-Sent Events stream (GET /api/events/stream).
+
+    A reader task parses batches off the stream and puts them on a bounded queue; a consumer
+    task hands each batch to `handler(events)` and only then saves the batch's cursor, so a
+    restart resumes after the last batch that was fully handled. When the handler falls behind
+    the queue fills up and the reader stops reading, which pushes back on the backend instead
+    of buffering without limit.
+    """
+
+    def __init__(self, client, handler, cursor_path, queue_size=50, max_backoff=60):
+        self.client = client
+        self.handler = handler
+        self.cursor_path = cursor_path
+        self.max_backoff = max_backoff
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.cursor = self._load_cursor()
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._read_forever(), name="event-stream-reader"),
+            asyncio.create_task(self._consume_forever(), name="event-stream-consumer"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _load_cursor(self):
+        try:
+            with open(self.cursor_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _save_cursor(self, cursor):
+        tmp_path = f"{self.cursor_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(cursor)
+        os.replace(tmp_path, self.cursor_path)
+
+    async def _read_forever(self):
+        # The reader's position, which runs ahead of the saved cursor by whatever is queued
+        position = self.cursor
+        backoff = 1
+        while True:
+            headers = {'Accept': 'text/event-stream'}
+            if position is not None:
+                headers['Last-Event-ID'] = position
+            try:
+                async with self.client.stream('/api/events/stream', headers=headers) as resp:
+                    if resp.status != 200:
+                        raise BackendError(f"event stream returned {resp.status}", status=resp.status)
+                    backoff = 1
+                    async for event_id, data in _parse_sse(resp.content):
+                        # Blocks while the queue is full
+                        await self.queue.put((event_id, json.loads(data)))
+                        position = event_id
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, BackendError, ValueError) as e:
+                logger.warning("Event stream disconnected (%s), reconnecting in %ss", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    async def _consume_forever(self):
+        while True:
+            event_id, events = await self.queue.get()
+            try:
+                await self.handler(events)
+            except Exception:
+                logger.exception("Event handler failed for batch ending at %s", event_id)
+            self.cursor = event_id
+            self._save_cursor(event_id)
+            self.queue.task_done()
+
+
+async def _parse_sse(content):
+    """
+    Yields (id, data) for every 'batch' message in an SSE byte stream.
+    """
+    event_id, event_type, data = None, None, []
+    async for raw_line in content:
+        line = raw_line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if event_type == 'batch' and data and event_id is not None:
+                yield event_id, '\n'.join(data)
+            event_type, data = None, []
+        elif line.startswith(':'):
+            continue  # comment / keepalive
+        else:
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'id':
+                event_id = value
+            elif field == 'event':
+                event_type = value
+            elif field == 'data':
+                data.append(value)
@@ -0,0 +1,112 @@
+import math
+import time
+from collections import defaultdict, deque
+
+
+class CommandMetrics:
+    """
+    Response-time samples for each slash command.
+
+    time-to-ack is measured from when Discord created the interaction to when the bot
+    deferred it; Discord fails the interaction if this passes 3 seconds. time-to-followup
+    runs to when the command's result was sent. The newest `window` samples per command
+    are kept, so a summary describes recent behaviour.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self._ack = defaultdict(lambda: deque(maxlen=self.window))
+        self._followup = defaultdict(lambda: deque(maxlen=self.window))
+        self._failures = defaultdict(int)
+        self._late_acks = defaultdict(int)
+
+    def observe(self, command, ack_seconds, followup_seconds, ok=True):
+        self._ack[command].append(ack_seconds)
+        if followup_seconds is not None:
+            self._followup[command].append(followup_seconds)
+        if not ok:
+            self._failures[command] += 1
+        if ack_seconds >= 3:
+            self._late_acks[command] += 1
+
+    def summary(self):
+        """
+        Returns {command: {count, failures, late_acks, ack_p50_ms, ack_p95_ms, followup_p50_ms, followup_p95_ms}}.
+        """
+        return {
+            command: {
+                "count": len(acks),
+                "failures": self._failures[command],
+                "late_acks": self._late_acks[command],
+                "ack_p50_ms": _percentile_ms(acks, 50),
+                "ack_p95_ms": _percentile_ms(acks, 95),
+                "followup_p50_ms": _percentile_ms(self._followup[command], 50),
+                "followup_p95_ms": _percentile_ms(self._followup[command], 95),
+            }
+            for command, acks in self._ack.items()
+        }
+
+
+class ShardMetrics:
+    """
+    Gateway health per shard: heartbeat latency (read from the bot when summarizing), the rate
+    of messages and interactions the shard delivered over the last `window` seconds, and how
+    often it disconnected. A shard with high latency or an outsized share of events is the one
+    to move to another process.
+    """
+
+    def __init__(self, window=300, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        # shard -> deque of [second, events in that second], oldest first
+        self._events = defaultdict(deque)
+        self._disconnects = defaultdict(int)
+
+    def observe_event(self, shard_id):
+        second = int(self.clock())
+        counts = self._events[shard_id]
+        if counts and counts[-1][0] == second:
+            counts[-1][1] += 1
+        else:
+            counts.append([second, 1])
+            self._trim(counts, second)
+
+    def observe_disconnect(self, shard_id):
+        self._disconnects[shard_id] += 1
+
+    def summary(self, latencies):
+        """
+        Takes the bot's [(shard_id, latency_seconds)] and returns
+        {shard_id: {latency_ms, events_per_second, disconnects}}.
+        """
+        now = int(self.clock())
+        result = {}
+        for shard_id, latency in latencies:
+            counts = self._events[shard_id]
+            self._trim(counts, now)
+            result[shard_id] = {
+                # nan or inf until the shard's first heartbeat is acknowledged
+                "latency_ms": round(latency * 1000, 1) if math.isfinite(latency) else None,
+                "events_per_second": round(sum(count for _, count in counts) / self.window, 2),
+                "disconnects": self._disconnects[shard_id],
+            }
+        return result
+
+    def _trim(self, counts, now):
+        while counts and counts[0][0] <= now - self.window:
+            counts.popleft()
+
+
+def _percentile_ms(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+def seconds_since(moment):
+    """
+    Seconds from an aware datetime (such as interaction.created_at) until now.
+    """
+    return time.time() - moment.timestamp()
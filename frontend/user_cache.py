@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+
+
+class UserStateCache:
+    """
+    What the bot knows about each user: their profile and their full task list.
+
+    Entries are keyed by discord_id, expire `ttl` seconds after they were loaded, and the least
+    recently used user is dropped once `maxsize` users are cached. The bot's own write commands
+    update an entry in place (write-through) instead of dropping it. Task events from the
+    backend drop a user's task list unless they only describe writes the bot already applied,
+    so changes made elsewhere (the text client, another bot instance) are picked up.
+    """
+
+    def __init__(self, maxsize=1000, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # discord_id -> {'profile': (expires_at, dict), 'tasks': (expires_at, {task_id: task}),
+        #                'long_tasks': (expires_at, True) when the list is too long to cache}
+        self._entries = OrderedDict()
+        # discord_id -> {('created' | 'updated' | 'deleted', task_id)} written through but not yet
+        # seen as an event
+        self._own_writes = {}
+
+    def _get(self, discord_id, kind):
+        entry = self._entries.get(discord_id)
+        cached = entry.get(kind) if entry else None
+        if cached is None or cached[0] <= self.clock():
+            if cached is not None:
+                del entry[kind]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(discord_id)
+        self.hits += 1
+        return cached[1]
+
+    def _set(self, discord_id, kind, value):
+        entry = self._entries.setdefault(discord_id, {})
+        entry[kind] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(discord_id)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self._own_writes.pop(evicted, None)
+
+    def _cached_tasks(self, discord_id):
+        # Like _get, but for write-through: doesn't count as a hit or miss and ignores expired lists
+        entry = self._entries.get(discord_id)
+        cached = entry.get('tasks') if entry else None
+        return cached[1] if cached is not None and cached[0] > self.clock() else None
+
+    def get_profile(self, discord_id):
+        return self._get(discord_id, 'profile')
+
+    def set_profile(self, discord_id, profile):
+        self._set(discord_id, 'profile', dict(profile))
+
+    def get_tasks(self, discord_id):
+        """
+        Returns the user's tasks in id order, or None if they aren't cached.
+        """
+        tasks = self._get(discord_id, 'tasks')
+        return None if tasks is None else [dict(task) for _, task in sorted(tasks.items())]
+
+    def set_tasks(self, discord_id, tasks):
+        self._set(discord_id, 'tasks', {task['id']: dict(task) for task in tasks})
+        self._entries[discord_id].pop('long_tasks', None)
+        self._own_writes.pop(discord_id, None)
+
+    def mark_long_task_list(self, discord_id):
+        """
+        Records that the user has too many tasks to cache, so their pages are fetched one at a
+        time until the mark expires like any other entry.
+        """
+        self._set(discord_id, 'long_tasks', True)
+
+    def has_long_task_list(self, discord_id):
+        entry = self._entries.get(discord_id)
+        cached = entry.get('long_tasks') if entry else None
+        return cached is not None and cached[0] > self.clock()
+
+    def task_added(self, discord_id, task):
+        tasks = self._cached_tasks(discord_id)
+        if tasks is not None:
+            tasks[task['id']] = dict(task)
+            self._own_writes.setdefault(discord_id, set()).add(('created', task['id']))
+
+    def task_updated(self, discord_id, task_id, changes):
+        tasks = self._cached_tasks(discord_id)
+        if tasks is not None and task_id in tasks:
+            tasks[task_id].update(changes)
+            self._own_writes.setdefault(discord_id, set()).add(('updated', task_id))
+
+    def task_deleted(self, discord_id, task_id):
+        tasks = self._cached_tasks(discord_id)
+        if tasks is not None and task_id in tasks:
+            del tasks[task_id]
+            self._own_writes.setdefault(discord_id, set()).add(('deleted', task_id))
+
+    def apply_task_event(self, discord_id, payload):
+        """
+        Handles a 'task' event ({"created": [...], "updated": [...], "deleted": [...]}).
+        """
+        changes = {(kind, task_id) for kind in ('created', 'updated', 'deleted') for task_id in payload.get(kind, [])}
+        own = self._own_writes.get(discord_id, set())
+        if changes <= own:
+            own -= changes
+            return
+        self.invalidate_tasks(discord_id)
+
+    def invalidate_tasks(self, discord_id):
+        entry = self._entries.get(discord_id)
+        if entry:
+            entry.pop('tasks', None)
+        self._own_writes.pop(discord_id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -1,10 +1,43 @@
-import requests
+"""
+Command line client for the Nosy Canary backend.
+
+    python client.py list_tasks 123456789012345678
+    python client.py create_task 123456789012345678 "Write integration tests" --notes "No notes yet"
+    python client.py run operations.jsonl --concurrency 16
+
+Commands that take a discord_id fall back to YOUR_DISCORD_ID from the environment (or .env).
+`run` executes a file of operations concurrently over one aiohttp session, one JSON object
+per line: {"method": "POST", "path": "/api/tasks", "json": {"discord_id": "...", "description": "..."}}
+"""
+import argparse
+import asyncio
+import json
 import os
+import random
+import sys
+import time
+
+import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 YOUR_DISCORD_ID = os.getenv("YOUR_DISCORD_ID")
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:5000')
+# For how long `run` keeps waiting out 429s (Retry-After) before counting an operation as failed
+MAX_RATE_LIMIT_WAIT = 120
+
+# One session, so consecutive calls reuse the same keep-alive connection
+session = requests.Session()
+
+def call(method, path, json=None, params=None):
+    return session.request(method, f"{API_BASE_URL}{path}", json=json, params=params)
+
+def show(r):
+    try:
+        body = json.dumps(r.json(), indent=2)
+    except ValueError:
+        body = r.text
+    print(f"{r.status_code} {r.reason}\n{body}")
 
 def create_task(discord_id, description, status='pending', notes=''):
     data = {
@@ -13,24 +46,271 @@ def create_task(discord_id, description, status='pending', notes=''):
         "status": status,
         "notes": notes
     }
-    r = requests.post(f"{API_BASE_URL}/api/tasks", json=data)
+    r = call('POST', "/api/tasks", json=data)
     if r.status_code == 201:
         print(f"Task created successfully! Task ID: {r.json()['task_id']}")
     else:
         print("Failed to create task. Response:", r.json())
 
+def batch_tasks(discord_id, operations):
+    """
+    Sends several task operations in one request, e.g.
+    [{"op": "create", "description": "..."}, {"op": "update", "task_id": 1, "status": "completed"}, {"op": "delete", "task_id": 2}]
+    """
+    data = {
+        "discord_id": discord_id,
+        "operations": operations
+    }
+    r = call('POST', "/api/tasks/batch", json=data)
+    if r.status_code == 200:
+        print("Batch applied:", r.json()['results'])
+    else:
+        print("Batch rejected. Response:", r.json())
+
+def list_tasks(discord_id, limit=None, after_id=None, status=None, fields=None, all_pages=False):
+    params = {key: value for key, value in
+              {"limit": limit, "after_id": after_id, "status": status, "fields": fields}.items()
+              if value is not None}
+    while True:
+        r = call('GET', f"/api/tasks/{discord_id}", params=params)
+        show(r)
+        next_cursor = r.json().get('next_cursor') if r.ok else None
+        if not all_pages or next_cursor is None:
+            return
+        params["after_id"] = next_cursor
+
+def fetch_all(path, key, cursor_param):
+    params = {"limit": 200}
+    rows = []
+    while True:
+        r = call('GET', path, params=params)
+        r.raise_for_status()
+        body = r.json()
+        rows += body[key]
+        if body['next_cursor'] is None:
+            return rows
+        params[cursor_param] = body['next_cursor']
+
+def sync_replica(discord_id, path):
+    """
+    Brings a local JSON copy of a user's tasks and intentions up to date through
+    GET /api/sync, downloading everything only on the first run or when the backend asks for a reset.
+    """
+    try:
+        with open(path) as f:
+            replica = json.load(f)
+    except FileNotFoundError:
+        replica = {"cursor": None, "tasks": {}, "intentions": {}}
+
+    params = {"since": replica["cursor"]} if replica["cursor"] is not None else {}
+    r = call('GET', f"/api/sync/{discord_id}", params=params)
+    if not r.ok:
+        show(r)
+        return
+    body = r.json()
+    if body["reset"]:
+        # Everything changed after the returned cursor is sent again by the next sync
+        replica["tasks"] = {str(t["id"]): t for t in fetch_all(f"/api/tasks/{discord_id}", "tasks", "after_id")}
+        replica["intentions"] = {str(i["id"]): i for i in
+                                 fetch_all(f"/api/intentions/{discord_id}/history", "intentions", "cursor")}
+        print(f"Reloaded {len(replica['tasks'])} tasks and {len(replica['intentions'])} intentions")
+    else:
+        for kind in ("tasks", "intentions"):
+            for object_id in body["deleted"][kind]:
+                replica[kind].pop(str(object_id), None)
+            for row in body[kind]:
+                replica[kind][str(row["id"])] = row
+        print(f"Applied {len(body['tasks'])} task and {len(body['intentions'])} intention changes, "
+              f"{len(body['deleted']['tasks'])} task deletions")
+    replica["cursor"] = body["cursor"]
+
+    with open(path, 'w') as f:
+        json.dump(replica, f, indent=2)
+    print(f"{path} is at cursor {replica['cursor']}")
+
 def test_timer(discord_id):
-    r = requests.get(f"{API_BASE_URL}/api/timer/{discord_id}")
+    r = call('GET', f"/api/timer/{discord_id}")
     print("Timer response:", r.json())
 
-if __name__ == "__main__":
-    # Example usage: If not loading from .env file,
-    # Replace 'YOUR_DISCORD_ID' with the actual Discord user ID you want to test with.
-    my_discord_id = YOUR_DISCORD_ID
+def percentile(sorted_values, pct):
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def run_operations(operations, concurrency):
+    """
+    Runs every operation over one aiohttp session with at most `concurrency` in flight,
+    printing each request's timing and then a summary. A rate-limited (429) operation is sent
+    again after its Retry-After, for up to MAX_RATE_LIMIT_WAIT seconds; its timing includes the waits.
+    """
+    import aiohttp
+
+    slots = asyncio.Semaphore(concurrency)
+    timings = []
+    failures = 0
+    rate_limited = 0
 
-    # Create a new task for your user
-    create_task(my_discord_id, "Write integration test instructions", status="pending", notes="No notes yet")
+    async def run_one(http, op):
+        nonlocal failures, rate_limited
+        method = op.get('method', 'GET').upper()
+        path = op['path']
+        async with slots:
+            began = time.perf_counter()
+            while True:
+                try:
+                    async with http.request(method, f"{API_BASE_URL}{path}", json=op.get('json'), params=op.get('params')) as resp:
+                        await resp.read()
+                        status = resp.status
+                        retry_after = resp.headers.get('Retry-After', '1')
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status = f"error ({e or e.__class__.__name__})"
+                    break
+                wait = int(retry_after) if retry_after.isdigit() else 1
+                if status != 429 or time.perf_counter() - began + wait > MAX_RATE_LIMIT_WAIT:
+                    break
+                rate_limited += 1
+                # Jitter, so operations limited together don't all come back at the same moment
+                await asyncio.sleep(wait + random.random())
+            elapsed = (time.perf_counter() - began) * 1000
+        timings.append(elapsed)
+        if not isinstance(status, int) or status >= 400:
+            failures += 1
+        print(f"[{elapsed:9.2f} ms] {status} {method} {path}")
 
-    # Optionally, test the timer endpoint
-    test_timer(my_discord_id)
+    began = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        await asyncio.gather(*(run_one(http, op) for op in operations))
+    total = time.perf_counter() - began
 
+    timings.sort()
+    print(f"\n{len(timings)} requests, {failures} failed, {rate_limited} rate-limited retries, "
+          f"in {total:.2f}s ({len(timings) / total:.1f} req/s)")
+    if timings:
+        print(f"latency ms: min {timings[0]:.2f}  p50 {percentile(timings, 50):.2f}  "
+              f"p95 {percentile(timings, 95):.2f}  p99 {percentile(timings, 99):.2f}  max {timings[-1]:.2f}")
+    return failures
+
+def load_operations(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def with_discord_id(name, help):
+        p = sub.add_parser(name, help=help)
+        p.add_argument('discord_id', nargs='?', default=YOUR_DISCORD_ID)
+        return p
+
+    with_discord_id('get_user', "show a user")
+    p = with_discord_id('set_user', "create or update a user")
+    p.add_argument('--bedtime', help="canary bedtime as HH:MM (UTC)")
+
+    p = with_discord_id('list_tasks', "list a user's tasks")
+    p.add_argument('--limit', type=int)
+    p.add_argument('--after-id', type=int)
+    p.add_argument('--status', choices=['pending', 'in-progress', 'completed'])
+    p.add_argument('--fields', help="comma-separated subset of id,description,status,notes")
+    p.add_argument('--all', action='store_true', help="follow next_cursor through every page")
+
+    p = with_discord_id('create_task', "create a task")
+    p.add_argument('description')
+    p.add_argument('--status', default='pending')
+    p.add_argument('--notes', default='')
+
+    p = sub.add_parser('update_task', help="update a task")
+    p.add_argument('task_id', type=int)
+    p.add_argument('--description')
+    p.add_argument('--status')
+    p.add_argument('--notes')
+
+    p = sub.add_parser('delete_task', help="delete a task")
+    p.add_argument('task_id', type=int)
+
+    p = with_discord_id('batch_tasks', "apply a JSON list of task operations in one request")
+    p.add_argument('operations_file')
+
+    with_discord_id('get_intention', "show a user's latest intention")
+    p = with_discord_id('create_intention', "record an intention")
+    p.add_argument('text')
+
+    p = with_discord_id('intention_history', "list a user's intentions, newest first")
+    p.add_argument('--since', help="ISO date or datetime")
+    p.add_argument('--until', help="ISO date or datetime")
+    p.add_argument('--limit', type=int)
+    p.add_argument('--cursor')
+
+    p = with_discord_id('stats', "show daily counts, completion rate and streaks")
+    p.add_argument('--since', help="YYYY-MM-DD")
+    p.add_argument('--until', help="YYYY-MM-DD")
+
+    with_discord_id('timer', "show when a user's next prompt is due")
+
+    p = with_discord_id('search', "search a user's tasks, notes and intentions")
+    p.add_argument('-q', '--query', required=True)
+    p.add_argument('--limit', type=int)
+    p.add_argument('--offset', type=int)
+
+    p = with_discord_id('sync', "keep a local JSON replica of a user's tasks and intentions up to date")
+    p.add_argument('--file', help="replica file (default: replica-<discord_id>.json)")
+
+    p = sub.add_parser('events', help="show pushed events after a cursor")
+    p.add_argument('--after', type=int, default=0)
+    p.add_argument('--limit', type=int, default=100)
+
+    p = sub.add_parser('run', help="run a file of operations concurrently (async)")
+    p.add_argument('operations_file', help="JSON lines: {\"method\", \"path\", \"json\", \"params\"}")
+    p.add_argument('--concurrency', type=int, default=8)
+
+    args = parser.parse_args()
+    if 'discord_id' in args and args.discord_id is None:
+        parser.error("pass a discord_id or set YOUR_DISCORD_ID")
+
+    if args.command == 'get_user':
+        show(call('GET', f"/api/user/{args.discord_id}"))
+    elif args.command == 'set_user':
+        show(call('POST', "/api/user", json={"discord_id": args.discord_id, "canary_bedtime": args.bedtime}))
+    elif args.command == 'list_tasks':
+        list_tasks(args.discord_id, args.limit, args.after_id, args.status, args.fields, args.all)
+    elif args.command == 'create_task':
+        create_task(args.discord_id, args.description, args.status, args.notes)
+    elif args.command == 'update_task':
+        changes = {key: value for key, value in
+                   {"description": args.description, "status": args.status, "notes": args.notes}.items()
+                   if value is not None}
+        show(call('PUT', f"/api/tasks/{args.task_id}", json=changes))
+    elif args.command == 'delete_task':
+        show(call('DELETE', f"/api/tasks/{args.task_id}"))
+    elif args.command == 'batch_tasks':
+        with open(args.operations_file) as f:
+            batch_tasks(args.discord_id, json.load(f))
+    elif args.command == 'get_intention':
+        show(call('GET', f"/api/intentions/{args.discord_id}"))
+    elif args.command == 'create_intention':
+        show(call('POST', "/api/intentions", json={"discord_id": args.discord_id, "text": args.text}))
+    elif args.command == 'intention_history':
+        params = {key: value for key, value in
+                  {"since": args.since, "until": args.until, "limit": args.limit, "cursor": args.cursor}.items()
+                  if value is not None}
+        show(call('GET', f"/api/intentions/{args.discord_id}/history", params=params))
+    elif args.command == 'stats':
+        params = {key: value for key, value in {"since": args.since, "until": args.until}.items() if value is not None}
+        show(call('GET', f"/api/stats/{args.discord_id}", params=params))
+    elif args.command == 'timer':
+        test_timer(args.discord_id)
+    elif args.command == 'search':
+        params = {key: value for key, value in
+                  {"q": args.query, "limit": args.limit, "offset": args.offset}.items()
+                  if value is not None}
+        show(call('GET', f"/api/search/{args.discord_id}", params=params))
+    elif args.command == 'sync':
+        sync_replica(args.discord_id, args.file or f"replica-{args.discord_id}.json")
+    elif args.command == 'events':
+        show(call('GET', "/api/events", params={"after": args.after, "limit": args.limit}))
+    elif args.command == 'run':
+        failures = asyncio.run(run_operations(load_operations(args.operations_file), args.concurrency))
+        sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()